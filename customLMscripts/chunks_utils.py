@@ -0,0 +1,75 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# size of the byte ranges of a file processed by each task
+CHUNK_SIZE = 4 * 2**20
+
+def file_chunks(filepath, chunk_size=CHUNK_SIZE):
+    """
+    Split a file into byte ranges of (about) chunk_size bytes, each one ending at the end of a line
+    - output: a list of (start, end) offsets, covering the whole file
+    """
+    file_size = os.path.getsize(filepath)
+    chunks = []
+
+    with open(filepath, "rb") as file:
+        start = 0
+
+        while start < file_size:
+            file.seek(min(start + chunk_size, file_size) - 1)
+            # (move to the end of the line containing the last byte of the chunk)
+            file.readline()
+            end = file.tell()
+
+            chunks.append((start, end))
+            start = end
+
+    return chunks
+
+def read_chunk_lines(filepath, start, end, encoding="utf-8"):
+    """
+    Read the lines of a byte range of a file, as iterating a file opened in text mode does
+    (with universal newlines: the line endings are translated into "\\n")
+    """
+    with open(filepath, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode(encoding)
+
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    # (the last line has no line ending, and it is empty if the chunk ends with one)
+    return [line + "\n" for line in lines[:-1]] + ([lines[-1]] if len(lines[-1]) > 0 else [])
+
+def process_chunk(line_function, filepath, start, end, encoding="utf-8"):
+    return [line_function(line) for line in read_chunk_lines(filepath, start, end, encoding)]
+
+def map_file_chunks(filepath, line_function, workers=1, chunk_size=CHUNK_SIZE, encoding="utf-8", prefetch=None):
+    """
+    Apply a function to each line of a file, splitting it in chunks processed by worker processes,
+    with a bounded number of chunks in flight: the file is never loaded as a whole.
+    args:
+    - line_function: a function taking a line and returning the processed line (defined at the module level,
+      to be sent to the worker processes)
+    - workers: number of worker processes (1 to process the chunks in the current process)
+    - prefetch: maximum number of chunks being processed (or waiting to be consumed), by default 2 per worker
+    - output: a generator of the lists of processed lines of each chunk, in the order of the file
+    """
+    chunks = file_chunks(filepath, chunk_size)
+
+    if workers <= 1:
+        for start, end in chunks:
+            yield process_chunk(line_function, filepath, start, end, encoding)
+        return
+
+    prefetch = prefetch or 2 * workers
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for start, end in chunks:
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+
+            pending.append(executor.submit(process_chunk, line_function, filepath, start, end, encoding))
+
+        while len(pending) > 0:
+            yield pending.popleft().result()
@@ -0,0 +1,262 @@
+import bisect
+import hashlib
+import heapq
+import itertools
+import mmap
+import os
+import shutil
+import tempfile
+from array import array
+from collections import Counter
+
+# memory for the hashes kept in memory before spilling them to disk (in bytes)
+DEDUPE_MEMORY_BUDGET = 256 * 2**20
+# (approximate) memory taken by a hash in a Python set: the set slot and the int object
+HASH_MEMORY_SIZE = 72
+# the spilled hashes are split in 2**PARTITION_BITS partitions, according to their first bits
+PARTITION_BITS = 4
+# the runs of a partition are merged into one when they become more than this
+MAX_RUNS_PER_PARTITION = 8
+# number of lines of the duplicates report (the most duplicated ones)
+DUPLICATES_REPORT_MAX_LINES = 10000
+
+def line_hash(line):
+    # 64-bit hash of a line (the probability of a collision among a billion lines is about 3%)
+    return int.from_bytes(hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest(), "little")
+
+class HashRun:
+    """
+    Sorted array of 64-bit hashes saved in a file and memory-mapped (its pages are loaded by
+    the operating system only when needed), supporting binary searches
+    args:
+    - sorted_hashes: a (non empty) iterable of sorted hashes, written to the file one block at a time
+    """
+
+    def __init__(self, filepath, sorted_hashes):
+        self.filepath = filepath
+        sorted_hashes = iter(sorted_hashes)
+
+        with open(filepath, "wb") as file:
+            for block in iter(lambda: array("Q", itertools.islice(sorted_hashes, 2**16)), array("Q")):
+                block.tofile(file)
+
+        self.file = open(filepath, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.hashes = memoryview(self.map).cast("Q")
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, hash_value):
+        i = bisect.bisect_left(self.hashes, hash_value)
+        return i < len(self.hashes) and self.hashes[i] == hash_value
+
+    def __iter__(self):
+        return iter(self.hashes)
+
+    def close(self):
+        self.hashes.release()
+        self.map.close()
+        self.file.close()
+        os.remove(self.filepath)
+
+class CountsRun:
+    """
+    Array of (hash, count) pairs sorted by hash, saved in a file and read back sequentially
+    args:
+    - sorted_counts: an iterable of (hash, count) pairs sorted by hash, written to the file one block at a time
+    """
+
+    def __init__(self, filepath, sorted_counts):
+        self.filepath = filepath
+        values = itertools.chain.from_iterable(sorted_counts)
+
+        with open(filepath, "wb") as file:
+            for block in iter(lambda: array("Q", itertools.islice(values, 2**16)), array("Q")):
+                block.tofile(file)
+
+    def __iter__(self):
+        with open(self.filepath, "rb") as file:
+            while True:
+                block = array("Q")
+                block.frombytes(file.read(2**17 * block.itemsize))
+                if len(block) == 0:
+                    return
+
+                yield from zip(block[0::2], block[1::2])
+
+    def close(self):
+        os.remove(self.filepath)
+
+def merge_counts(*sorted_counts):
+    """
+    Merge some iterables of (hash, count) pairs sorted by hash, summing the counts of the same hash
+    - output: a generator of the (hash, total count) pairs, sorted by hash
+    """
+    for hash_value, counts in itertools.groupby(heapq.merge(*sorted_counts), key=lambda pair: pair[0]):
+        yield hash_value, sum(count for _, count in counts)
+
+class StreamingDeduplicator:
+    """
+    Remove the duplicated lines of a stream, keeping the first occurrence of each one (in the order of the stream).
+    Only a 64-bit hash of each seen line is kept: when the hashes exceed the memory budget, they are spilled
+    to disk as sorted runs, split in partitions according to their first bits, and searched there afterwards.
+    The duplicates of each line (e.g. of each template, once its entities are substituted with placeholders)
+    are counted, unless count_duplicates is False: the counts are keyed by the hash of the line as well, and
+    they are spilled together with the hashes (the lines of the report are found again in a second pass).
+    args:
+    - memory_budget: memory for the hashes kept in memory (in bytes)
+    - temp_dir: directory of the spilled runs (the system temp dir by default)
+    """
+
+    def __init__(self, memory_budget=DEDUPE_MEMORY_BUDGET, temp_dir=None, count_duplicates=True):
+        self.max_hashes_in_memory = max(memory_budget // HASH_MEMORY_SIZE, 1)
+        self.temp_dir = temp_dir
+        self.count_duplicates = count_duplicates
+
+        self.hashes = set()
+        self.partitions_runs = [[] for _ in range(2**PARTITION_BITS)]
+        self.counts_runs = []
+        self.runs_dirpath = None
+        self.num_runs = 0
+
+        self.num_lines = 0
+        self.num_unique_lines = 0
+        self.duplicates_counts = Counter()
+
+    def partition(self, hash_value):
+        return hash_value >> (64 - PARTITION_BITS)
+
+    def new_run_filepath(self):
+        if self.runs_dirpath is None:
+            self.runs_dirpath = tempfile.mkdtemp(prefix="dedupe-", dir=self.temp_dir)
+
+        self.num_runs += 1
+        return os.path.join(self.runs_dirpath, "run-%06d.bin" % self.num_runs)
+
+    def spill(self):
+        """
+        Move the hashes in memory to disk: one new sorted run for each partition (and one run of the duplicates counts)
+        """
+        partitions_hashes = [[] for _ in self.partitions_runs]
+        for hash_value in sorted(self.hashes):
+            partitions_hashes[self.partition(hash_value)].append(hash_value)
+
+        self.hashes.clear()
+
+        for runs, hashes in zip(self.partitions_runs, partitions_hashes):
+            if len(hashes) == 0:
+                continue
+
+            runs.append(HashRun(self.new_run_filepath(), hashes))
+
+            if len(runs) > MAX_RUNS_PER_PARTITION:
+                # (the runs are disjoint: a hash is spilled only once)
+                merged_run = HashRun(self.new_run_filepath(), heapq.merge(*runs))
+                for run in runs:
+                    run.close()
+                runs[:] = [merged_run]
+
+        if len(self.duplicates_counts) > 0:
+            self.counts_runs.append(CountsRun(self.new_run_filepath(), sorted(self.duplicates_counts.items())))
+            self.duplicates_counts.clear()
+
+            if len(self.counts_runs) > MAX_RUNS_PER_PARTITION:
+                merged_run = CountsRun(self.new_run_filepath(), merge_counts(*self.counts_runs))
+                for run in self.counts_runs:
+                    run.close()
+                self.counts_runs = [merged_run]
+
+    def is_new(self, line):
+        """
+        Check if a line was not seen yet (and count it as seen)
+        """
+        hash_value = line_hash(line)
+        self.num_lines += 1
+
+        if hash_value in self.hashes or any(hash_value in run for run in self.partitions_runs[self.partition(hash_value)]):
+            if self.count_duplicates:
+                self.duplicates_counts[hash_value] += 1
+
+                if len(self.hashes) + len(self.duplicates_counts) >= self.max_hashes_in_memory:
+                    self.spill()
+            return False
+
+        self.hashes.add(hash_value)
+        self.num_unique_lines += 1
+
+        if len(self.hashes) + len(self.duplicates_counts) >= self.max_hashes_in_memory:
+            self.spill()
+
+        return True
+
+    def filter(self, lines):
+        """
+        - output: a generator of the lines seen for the first time
+        """
+        return (line for line in lines if self.is_new(line))
+
+    def write_duplicates_report(self, csv_filepath, lines_filepath, max_lines=DUPLICATES_REPORT_MAX_LINES):
+        """
+        Write the number of duplicates of the most duplicated lines (from the most duplicated one, and in order of
+        first occurrence among the ones with the same count), as csv rows "count,line" (the line is written as it is:
+        it can contain commas itself). Only the hashes of the lines are counted: their text is then found in a 
+        second pass over a file containing each line (e.g. the deduplicated output).
+        args:
+        - lines_filepath: the file of the (unique) lines
+        - max_lines: maximum number of lines of the report (None to report all the duplicated lines)
+        """
+        counts = merge_counts(sorted(self.duplicates_counts.items()), *self.counts_runs)
+
+        if max_lines is None:
+            reported_counts = dict(counts)
+        else:
+            reported_counts = dict(heapq.nlargest(max_lines, counts, key=lambda pair: pair[1]))
+
+        reported_lines = []
+
+        with open(lines_filepath, "r") as file:
+            for position, line in enumerate(file):
+                count = reported_counts.get(line_hash(line))
+
+                if count is not None:
+                    reported_lines.append((-count, position, line))
+
+        with open(csv_filepath, "w") as file:
+            for negative_count, _, line in sorted(reported_lines):
+                file.write("%d,%s\n" % (-negative_count, line.rstrip("\n")))
+
+    def close(self):
+        for runs in self.partitions_runs:
+            for run in runs:
+                run.close()
+            runs.clear()
+
+        for run in self.counts_runs:
+            run.close()
+        self.counts_runs.clear()
+
+        if self.runs_dirpath is not None:
+            shutil.rmtree(self.runs_dirpath, ignore_errors=True)
+            self.runs_dirpath = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def dedupe_file(input_filepath, output_filepath, duplicates_report_filepath=None, memory_budget=DEDUPE_MEMORY_BUDGET, temp_dir=None):
+    """
+    Copy the lines of a file without their duplicates, keeping the order of their first occurrence
+    (optionally, writing the duplicates counts to a csv report)
+    - output: the deduplicator, with the number of read and unique lines
+    """
+    with StreamingDeduplicator(memory_budget, temp_dir, count_duplicates=duplicates_report_filepath is not None) as deduplicator:
+        with open(input_filepath, "r") as inputFile, open(output_filepath, "w") as outputFile:
+            outputFile.writelines(deduplicator.filter(inputFile))
+
+        if duplicates_report_filepath is not None:
+            deduplicator.write_duplicates_report(duplicates_report_filepath, output_filepath)
+
+    return deduplicator
@@ -0,0 +1,83 @@
+import re
+
+# zero-width positions between a word character and a non-word one (as \b in a regex)
+WORD_BOUNDARY_REGEX = re.compile(r"\b")
+# key of the trie nodes storing the placeholder of the value ending there
+VALUE_END = ""
+
+def is_word_char(char):
+    # same definition of \w in the str regexes
+    return char.isalnum() or char == "_"
+
+def is_word_boundary(text, i):
+    return (i > 0 and is_word_char(text[i - 1])) != (i < len(text) and is_word_char(text[i]))
+
+class Gazetteer:
+    """
+    Dictionary of entity values (e.g. names and banks), each one with the placeholder substituting it,
+    stored in a characters trie: all the values are found in a single scan of a text.
+    The matching is case sensitive, and a value is only matched at word boundaries (as "\\bvalue\\b" in a regex);
+    among the values starting at the same position, the longest one is substituted (e.g. "HSBC Singapore"
+    as a whole, instead of "HSBC" followed by "Singapore").
+    If the same value is added with different placeholders, the first one is kept.
+    """
+
+    def __init__(self):
+        self.trie = {}
+        self.num_values = 0
+
+    def add(self, values, placeholder):
+        for value in values:
+            if len(value) == 0:
+                continue
+
+            node = self.trie
+            for char in value:
+                node = node.setdefault(char, {})
+
+            if VALUE_END not in node:
+                node[VALUE_END] = placeholder
+                self.num_values += 1
+
+    def __len__(self):
+        return self.num_values
+
+    def longest_match(self, text, start):
+        """
+        - output: the (end, placeholder) of the longest value starting at text[start] and ending at a
+          word boundary, or (None, None) if there is none
+        """
+        node = self.trie
+        match = (None, None)
+
+        for i in range(start, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+
+            if VALUE_END in node and is_word_boundary(text, i + 1):
+                match = (i + 1, node[VALUE_END])
+
+        return match
+
+    def substitute(self, text):
+        """
+        Substitute the values found in a text with their placeholders (leftmost-longest matching, without
+        overlaps: a value is never searched inside an already substituted one)
+        """
+        pieces = []
+        last_end = 0
+
+        for boundary in WORD_BOUNDARY_REGEX.finditer(text):
+            start = boundary.start()
+            if start < last_end:
+                continue
+
+            end, placeholder = self.longest_match(text, start)
+            if end is not None:
+                pieces.append(text[last_end:start])
+                pieces.append(placeholder)
+                last_end = end
+
+        pieces.append(text[last_end:])
+        return "".join(pieces)
@@ -1,43 +1,89 @@
 from names_utils import english_first_names, italian_first_names, english_surnames, italian_surnames
 from bank_names_utils import bank_names
-import re
+from gazetteer_utils import Gazetteer
+from chunks_utils import map_file_chunks, CHUNK_SIZE
+from dedupe_utils import StreamingDeduplicator, DEDUPE_MEMORY_BUDGET
+import argparse
+import contextlib
+import os
+import sys
 
+# sources of the dataset generation, whose profiling utilities are shared by this script
+DATASET_SOURCES_DIRPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dataset", "src")
 
-inputFile = open("intents.csv", "r")
-outputFile = open("result.csv", "w")
 
 first_name_placeholder = "<name>"
 surname_placeholder = "<surname>"
 bank_placeholder = "<bank>"
 
-for i,line in enumerate(inputFile):
-    if i % 1000 == 0:
-        print("#%d iteration" % i)
-
-    # first names
-    for enFirstName in english_first_names:
-        pattern = "\\b%s\\b" % enFirstName
-        line = re.sub(pattern, first_name_placeholder, line)
-
-    for itaFirstName in italian_first_names:
-        pattern = "\\b%s\\b" % itaFirstName
-        line = re.sub(pattern, first_name_placeholder, line)
-
-    # surnames
-    for enSurname in english_surnames:
-        pattern = "\\b%s\\b" % enSurname
-        line = re.sub(pattern, surname_placeholder, line)
-    
-    for itaSurname in italian_surnames:
-        pattern = "\\b%s\\b" % itaSurname
-        line = re.sub(pattern, surname_placeholder, line)
-
-    # banks
-    for bankName in bank_names:
-        pattern = "\\b%s\\b" % bankName
-        line = re.sub(pattern, bank_placeholder, line)
-
-    outputFile.write(line)
-
-inputFile.close()
-outputFile.close()
\ No newline at end of file
+# all the names and banks, found in one scan of each line (if a value is in more than one class,
+# the first names take precedence over the surnames, and the surnames over the banks)
+gazetteer = Gazetteer()
+gazetteer.add(english_first_names + italian_first_names, first_name_placeholder)
+gazetteer.add(english_surnames + italian_surnames, surname_placeholder)
+gazetteer.add(bank_names, bank_placeholder)
+
+def substitute_placeholders(line):
+    return gazetteer.substitute(line)
+
+def substitute_placeholders_in_file(input_filepath, output_filepath, workers=1, chunk_size=CHUNK_SIZE, deduplicator=None):
+    """
+    Substitute the placeholders in each line of the input file, split in chunks processed in parallel by
+    the worker processes, and write the lines in the same order to the output file
+    args:
+    - deduplicator: a StreamingDeduplicator, to write only the first occurrence of each line (or None)
+    """
+    outputFile = open(output_filepath, "w")
+    numLines = 0
+
+    for lines in map_file_chunks(input_filepath, substitute_placeholders, workers, chunk_size):
+        outputFile.writelines(lines if deduplicator is None else deduplicator.filter(lines))
+        numLines += len(lines)
+        print("#%d lines" % numLines)
+
+    outputFile.close()
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Substitute the names and the banks of the sentences with placeholders")
+    parser.add_argument("input", nargs="?", default="intents.csv", help="file of the sentences, one per line")
+    parser.add_argument("output", nargs="?", default="result.csv", help="file of the substituted sentences")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="size (in bytes) of the chunks of the input file")
+    parser.add_argument("--dedupe", action="store_true", help="only write the first occurrence of each (substituted) line")
+    parser.add_argument("--duplicates-report", default=None, help="csv file of the number of duplicates of each line (with --dedupe)")
+    parser.add_argument("--dedupe-memory-budget", type=int, default=DEDUPE_MEMORY_BUDGET // 2**20, 
+                        help="memory for the hashes of the seen lines (in MB), beyond which they are spilled to disk")
+    args = parser.parse_args()
+
+    if args.chunk_size < 1:
+        parser.error("invalid value of --chunk-size: %d" % args.chunk_size)
+
+    if args.duplicates_report is not None and not args.dedupe:
+        parser.error("--duplicates-report requires --dedupe")
+
+    return args
+
+
+if __name__ == "__main__":
+    # (the entry point adds the dataset sources to the search path, after the local modules: importing this
+    # module, e.g. from the benchmarks, does not change the search path)
+    sys.path.append(DATASET_SOURCES_DIRPATH)
+    from utils.profiling_utils import profiling_from_environment
+
+    args = parse_arguments()
+
+    # (the substituted lines are deduplicated as they are written, without an intermediate file)
+    deduplicator = None
+    if args.dedupe:
+        deduplicator = StreamingDeduplicator(args.dedupe_memory_budget * 2**20, count_duplicates=args.duplicates_report is not None)
+
+    with deduplicator if deduplicator is not None else contextlib.nullcontext():
+        # (profiled if the PROFILE_MODE environment variable is set to cprofile or sampling)
+        with profiling_from_environment("profile"):
+            substitute_placeholders_in_file(args.input, args.output, args.workers, args.chunk_size, deduplicator)
+
+        if deduplicator is not None:
+            if args.duplicates_report is not None:
+                deduplicator.write_duplicates_report(args.duplicates_report, args.output)
+
+            print("%d unique lines out of %d" % (deduplicator.num_unique_lines, deduplicator.num_lines))
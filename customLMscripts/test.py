@@ -1,17 +1,6 @@
+from dedupe_utils import dedupe_file
 
 
-file = open("adjusted_result.csv")
-linesSet = set()
-
-for line in file:
-    linesSet.add(line)
-
-file.close()
-
-out = open("uniqueLines_result.csv", "w")
-
-for uniqueLine in linesSet:
-    out.write(uniqueLine)
-
-out.close()
-
+# unique lines, in the order of their first occurrence (with the number of duplicates of each line)
+deduplicator = dedupe_file("adjusted_result.csv", "uniqueLines_result.csv", duplicates_report_filepath="duplicates_report.csv")
+print("%d unique lines out of %d" % (deduplicator.num_unique_lines, deduplicator.num_lines))
@@ -1,6 +1,6 @@
 import random
-from utils.utils import trim_punctuation, generate_BIO_tokens_from_template, \
-    generate_grouped_intent_sentences_and_BIO_tokens, NONE_INTENT_LABEL
+from utils.utils import trim_punctuation, CompiledTemplate, \
+    generate_grouped_intent_sentences_and_BIO_tokens, mix_grouped_elements, NONE_INTENT_LABEL
 from utils.names_utils import generate_random_names_intents_and_labelled_tokens
 from utils.amount_utils import generate_random_amount_intents_and_labelled_tokens
 from utils.bank_names_utils import generate_bank_accounts_intents_and_labelled_tokens
@@ -508,6 +508,9 @@ generic_sentences = [
     "How to use the app's automated saving feature?",
 ]
 
+# sentences (without punctuation) parsed once, to render the labelled tokens
+compiled_generic_sentences = [CompiledTemplate(trim_punctuation(sentence)) for sentence in generic_sentences]
+
 def pick_none_intent_sentences(num_sentences):
     # (data augmentation)
     multiplier = 1 + num_sentences // len(generic_sentences)
@@ -518,39 +521,48 @@ def pick_none_intent_sentences(num_sentences):
     return all_sentences[:num_sentences]
 
 
+# pick a random template and the entities to substitute to its placeholders
+def pick_none_sample(rng=random):
+    template = rng.choice(compiled_generic_sentences)
+    return template, {}
+
 # generate both a sentence and the corresponding tokens
 def generate_none_sentence_and_tokens(tokenizer):
-    sentence = trim_punctuation(random.choice(generic_sentences))
-    
-    sentence, tokens, labels = generate_BIO_tokens_from_template(
-        sentence,
-        tokenizer
-    )
-
-    return sentence, tokens, labels    
+    template, entities = pick_none_sample()
+    return template.render(tokenizer, **entities)
 
-def generate_none_intents_and_labelled_tokens(num_sentences, tokenizer):
+def generate_none_intents_and_labelled_tokens(num_sentences, tokenizer, rng=random):
     return generate_grouped_intent_sentences_and_BIO_tokens(
         num_sentences,
         tokenizer,
         NONE_INTENT_LABEL,
-        generate_none_sentence_and_tokens
+        pick_none_sample,
+        rng=rng
     )
 
-def generate_none_intents_and_labelled_tokens_including_entities(num_sentences, tokenizer):
-    num_sentences_per_type = num_sentences // 4
+def generate_none_intents_and_labelled_tokens_including_entities(num_sentences, tokenizer, rng=random):
+    # exactly num_sentences sentences, split (almost) evenly among the 4 types
+    num_sentences_per_type, num_remaining_sentences = divmod(num_sentences, 4)
+    names_count, amounts_count, accounts_count, generic_sentences_count = \
+        [num_sentences_per_type + (1 if i < num_remaining_sentences else 0) for i in range(4)]
 
     # 1. generate random names
-    names_elements = generate_random_names_intents_and_labelled_tokens(num_sentences_per_type, tokenizer)
+    names_elements = generate_random_names_intents_and_labelled_tokens(names_count, tokenizer, rng)
 
     # 2. generate random amounts
-    amounts_elements = generate_random_amount_intents_and_labelled_tokens(num_sentences_per_type, tokenizer)
+    amounts_elements = generate_random_amount_intents_and_labelled_tokens(amounts_count, tokenizer, rng)
 
     # 3. generate random accounts
-    accounts_elements = generate_bank_accounts_intents_and_labelled_tokens(num_sentences_per_type, tokenizer)
+    accounts_elements = generate_bank_accounts_intents_and_labelled_tokens(accounts_count, tokenizer, rng)
 
     # 4. generate random sentences not expressing any intent
-    generic_sentences_elements = generate_none_intents_and_labelled_tokens(num_sentences_per_type, tokenizer)
+    generic_sentences_elements = generate_none_intents_and_labelled_tokens(generic_sentences_count, tokenizer, rng)
 
-    all_none_elements = names_elements + amounts_elements + accounts_elements + generic_sentences_elements
-    return all_none_elements
\ No newline at end of file
+    # lazily interleave them
+    all_none_elements = mix_grouped_elements([
+        (names_count, names_elements),
+        (amounts_count, amounts_elements),
+        (accounts_count, accounts_elements),
+        (generic_sentences_count, generic_sentences_elements)
+    ], rng)
+    return all_none_elements
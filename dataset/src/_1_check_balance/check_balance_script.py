@@ -1,7 +1,7 @@
 import random
 from utils.bank_names_utils import bank_names
 from utils.amount_utils import currencies_symbols, currencies_literals
-from utils.utils import trim_punctuation, generate_BIO_tokens_from_template, generate_grouped_intent_sentences_and_BIO_tokens, \
+from utils.utils import trim_punctuation, CompiledTemplate, generate_grouped_intent_sentences_and_BIO_tokens, \
     BANK_ENTITY_LABEL, CURRENCY_ENTITY_LABEL, CHECK_BALANCE_INTENT_LABEL
 
 # Expanded list of expressions to check the balance
@@ -55,6 +55,9 @@ check_balance_templates = [
     "Check the balance of my bank account.",
 ]
 
+# templates (without punctuation) parsed once, to render the labelled tokens
+compiled_check_balance_templates = [CompiledTemplate(trim_punctuation(template)) for template in check_balance_templates]
+
 
 def generate_check_balance_sentence():
     template = random.choice(check_balance_templates)
@@ -77,33 +80,37 @@ def generate_check_balance_dataset_of_at_most(num_sentences):
     unique_sentences = {generate_check_balance_sentence() for _ in range(num_sentences)}
     return unique_sentences
 
-# generate both a sentence and the corresponding tokens
-def generate_check_balance_sentence_and_tokens(tokenizer):
-    template = trim_punctuation(random.choice(check_balance_templates))
+# pick a random template and the entities to substitute to its placeholders
+def pick_check_balance_sample(rng=random):
+    template = rng.choice(compiled_check_balance_templates)
 
     # select either literal or symbolic currency 
-    if random.choice([True, False]):
-        currency = random.choice(currencies_symbols)
+    if rng.choice([True, False]):
+        currency = rng.choice(currencies_symbols)
     else:
-        currency = random.choice(currencies_literals)
+        currency = rng.choice(currencies_literals)
 
-    bank = random.choice(bank_names)
+    bank = rng.choice(bank_names)
 
-    sentence, tokens, token_labels = generate_BIO_tokens_from_template(
-        template,
-        tokenizer,
+    entities = dict(
         currency=(currency, CURRENCY_ENTITY_LABEL),
         bank=(bank, BANK_ENTITY_LABEL)
     )
 
-    return sentence, tokens, token_labels
+    return template, entities
+
+# generate both a sentence and the corresponding tokens
+def generate_check_balance_sentence_and_tokens(tokenizer):
+    template, entities = pick_check_balance_sample()
+    return template.render(tokenizer, **entities)
 
 # generate a certain number of sentences + tokens + labels
-def generate_check_balance_intents_and_labelled_tokens(num_sentences, tokenizer):
+def generate_check_balance_intents_and_labelled_tokens(num_sentences, tokenizer, rng=random):
     return generate_grouped_intent_sentences_and_BIO_tokens(
         num_sentences,
         tokenizer,
         CHECK_BALANCE_INTENT_LABEL,
-        generate_check_balance_sentence_and_tokens
+        pick_check_balance_sample,
+        rng=rng
     )
 
@@ -1,10 +1,10 @@
 import random
-from utils.names_utils import names
+from utils.names_utils import user_names_pool
 from utils.bank_names_utils import bank_names
-from utils.utils import trim_punctuation, generate_BIO_tokens_from_template, generate_grouped_intent_sentences_and_BIO_tokens, \
+from utils.utils import trim_punctuation, CompiledTemplate, generate_grouped_intent_sentences_and_BIO_tokens, \
     USER_ENTITY_LABEL, BANK_ENTITY_LABEL, CHECK_TRANSACTIONS_INTENT_LABEL
 
-user_names = names
+user_names = user_names_pool
 
 check_transactions_templates = [
     "Show me the recent transactions with {user} on my {bank} account.",
@@ -81,24 +81,37 @@ check_transactions_templates = [
     "What are my most recent transactions?",
 ]
 
+# 'default' and 'primary' banks read better when followed by 'account'
+def adjust_template_for_default_bank(template):
+    if "{bank}" in template and "{bank} account" not in template:
+        if "using account {bank}" in template:
+            template = template.replace("using account {bank}", "using {bank} account")
+        elif "my account {bank}" in template:
+            template = template.replace("my account {bank}", "my {bank} account")
+        elif "account at {bank}" in template:
+            template = template.replace("account at {bank}", "{bank} account")
+        elif "from {bank}" in template:
+            template = template.replace("from {bank}", "from my {bank} account")
+        elif "from my {bank}" in template:
+            template = template.replace("from my {bank}", "from my {bank} account")
+
+    return template
+
+# templates (without punctuation) parsed once, to render the labelled tokens: 
+# each one is paired with its variant for the 'default' and 'primary' banks
+compiled_check_transactions_templates = [
+    (CompiledTemplate(template), CompiledTemplate(adjust_template_for_default_bank(template)))
+    for template in map(trim_punctuation, check_transactions_templates)
+]
+
 def generate_check_transactions_sentence():
-    user = random.choice(user_names)
+    user = user_names.choice()
     bank = random.choice(bank_names)
     
     template = random.choice(check_transactions_templates)
 
-    if "{bank}" in template and bank in ["default", "primary"]:
-        if "{bank} account" not in template:
-            if "using account {bank}" in template:
-                template = template.replace("using account {bank}", "using {bank} account")
-            elif "my account {bank}" in template:
-                template = template.replace("my account {bank}", "my {bank} account")
-            elif "account at {bank}" in template:
-                template = template.replace("account at {bank}", "{bank} account")
-            elif "from {bank}" in template:
-                template = template.replace("from {bank}", "from my {bank} account")
-            elif "from my {bank}" in template:
-                template = template.replace("from my {bank}", "from my {bank} account")
+    if bank in ["default", "primary"]:
+        template = adjust_template_for_default_bank(template)
 
     sentence = template.format(user=user, bank=bank)
     sentence = trim_punctuation(sentence)
@@ -108,43 +121,37 @@ def generate_check_transactions_dataset_of_at_most(num_sentences):
     unique_sentences = {generate_check_transactions_sentence() for _ in range(num_sentences)}
     return unique_sentences
 
-# generate both a sentence and the corresponding tokens
-def generate_check_transactions_sentence_and_tokens(tokenizer):
+# pick a random template and the entities to substitute to its placeholders
+def pick_check_transactions_sample(rng=random):
     # generate random entities
-    user = random.choice(user_names)
-    bank = random.choice(bank_names)
+    user = user_names.choice(rng)
+    bank = rng.choice(bank_names)
 
     # retrieve template
-    template = trim_punctuation(random.choice(check_transactions_templates))
-
-    if "{bank}" in template and bank in ["default", "primary"]:
-        if "{bank} account" not in template:
-            if "using account {bank}" in template:
-                template = template.replace("using account {bank}", "using {bank} account")
-            elif "my account {bank}" in template:
-                template = template.replace("my account {bank}", "my {bank} account")
-            elif "account at {bank}" in template:
-                template = template.replace("account at {bank}", "{bank} account")
-            elif "from {bank}" in template:
-                template = template.replace("from {bank}", "from my {bank} account")
-            elif "from my {bank}" in template:
-                template = template.replace("from my {bank}", "from my {bank} account")
+    template, default_bank_template = rng.choice(compiled_check_transactions_templates)
+
+    if bank in ["default", "primary"]:
+        template = default_bank_template
 
     # create the formatted sentences, the corresponding tokens and their labels
-    sentence, tokens, token_labels = generate_BIO_tokens_from_template(
-        template,
-        tokenizer,
+    entities = dict(
         user=(user, USER_ENTITY_LABEL), 
         bank=(bank, BANK_ENTITY_LABEL)
     )
 
-    return sentence, tokens, token_labels
+    return template, entities
+
+# generate both a sentence and the corresponding tokens
+def generate_check_transactions_sentence_and_tokens(tokenizer):
+    template, entities = pick_check_transactions_sample()
+    return template.render(tokenizer, **entities)
 
 # generate a certain number of sentences + tokens + labels
-def generate_check_transactions_intents_and_labelled_tokens(num_sentences, tokenizer):
+def generate_check_transactions_intents_and_labelled_tokens(num_sentences, tokenizer, rng=random):
     return generate_grouped_intent_sentences_and_BIO_tokens(
         num_sentences,
         tokenizer,
         CHECK_TRANSACTIONS_INTENT_LABEL,
-        generate_check_transactions_sentence_and_tokens
+        pick_check_transactions_sample,
+        rng=rng
     )
\ No newline at end of file
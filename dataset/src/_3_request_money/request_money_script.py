@@ -1,12 +1,12 @@
 import random
-from utils.names_utils import names
+from utils.names_utils import user_names_pool
 from utils.bank_names_utils import bank_names
 from utils.amount_utils import random_amount
-from utils.utils import trim_punctuation, write_dataset, generate_BIO_tokens_from_template, \
+from utils.utils import trim_punctuation, write_dataset, CompiledTemplate, \
     generate_grouped_intent_sentences_and_BIO_tokens, \
     AMOUNT_ENTITY_LABEL, USER_ENTITY_LABEL, BANK_ENTITY_LABEL, REQUEST_MONEY_INTENT_LABEL
 
-sender_names = names
+sender_names = user_names_pool
 
 # Expanded set of templates 
 request_money_templates = [
@@ -164,30 +164,43 @@ request_money_templates = [
     "Initiate a request.",
 ]
 
+# 'default' and 'primary' banks read better when followed by 'account'
+def adjust_template_for_default_bank(template):
+    if "{bank}" in template and "{bank} account" not in template:
+        if "using {bank}" in template:
+            template = template.replace("using {bank}", "using my {bank} account")
+        elif "my account at {bank}" in template:
+            template = template.replace("my account at {bank}", "my {bank} account")
+        elif "account with {bank}" in template:
+            template = template.replace("account with {bank}", "{bank} account")
+        elif "via {bank}" in template:
+            template = template.replace("via {bank}", "via {bank} account")
+        elif "through {bank}" in template:
+            template = template.replace("through {bank}", "through {bank} account")
+        elif "at {bank}" in template:
+            template = template.replace("at {bank}", "at {bank} account")
+        elif "to {bank}" in template:
+            template = template.replace("to {bank}", "to {bank} account")
+
+    return template
+
+# templates (without punctuation) parsed once, to render the labelled tokens: 
+# each one is paired with its variant for the 'default' and 'primary' banks
+compiled_request_money_templates = [
+    (CompiledTemplate(template), CompiledTemplate(adjust_template_for_default_bank(template)))
+    for template in map(trim_punctuation, request_money_templates)
+]
+
 # Function to generate a sentence
 def generate_request_money_sentence():
-    sender = random.choice(sender_names)
+    sender = sender_names.choice()
     bank = random.choice(bank_names)
     amount = random_amount()  # Using the random_amount function
     
     template = random.choice(request_money_templates)
 
-    if "{bank}" in template and bank in ["default", "primary"]:
-        if "{bank} account" not in template:
-            if "using {bank}" in template:
-                template = template.replace("using {bank}", "using my {bank} account")
-            elif "my account at {bank}" in template:
-                template = template.replace("my account at {bank}", "my {bank} account")
-            elif "account with {bank}" in template:
-                template = template.replace("account with {bank}", "{bank} account")
-            elif "via {bank}" in template:
-                template = template.replace("via {bank}", "via {bank} account")
-            elif "through {bank}" in template:
-                template = template.replace("through {bank}", "through {bank} account")
-            elif "at {bank}" in template:
-                template = template.replace("at {bank}", "at {bank} account")
-            elif "to {bank}" in template:
-                template = template.replace("to {bank}", "to {bank} account")
+    if bank in ["default", "primary"]:
+        template = adjust_template_for_default_bank(template)
 
     sentence = template.format(amount=amount, sender=sender, bank=bank)
 
@@ -200,45 +213,35 @@ def generate_request_money_dataset_of_at_most(num_sentences):
     unique_sentences = {generate_request_money_sentence() for _ in range(num_sentences)}
     return unique_sentences
 
-# generate both a sentence and the corresponding tokens
-def generate_request_money_sentence_and_tokens(tokenizer):
-    sender = random.choice(sender_names)
-    bank = random.choice(bank_names)
-    amount = random_amount()  # Using the random_amount function
+# pick a random template and the entities to substitute to its placeholders
+def pick_request_money_sample(rng=random):
+    sender = sender_names.choice(rng)
+    bank = rng.choice(bank_names)
+    amount = random_amount(rng)  # Using the random_amount function
     
-    template = trim_punctuation(random.choice(request_money_templates))
-
-    if "{bank}" in template and bank in ["default", "primary"]:
-        if "{bank} account" not in template:
-            if "using {bank}" in template:
-                template = template.replace("using {bank}", "using my {bank} account")
-            elif "my account at {bank}" in template:
-                template = template.replace("my account at {bank}", "my {bank} account")
-            elif "account with {bank}" in template:
-                template = template.replace("account with {bank}", "{bank} account")
-            elif "via {bank}" in template:
-                template = template.replace("via {bank}", "via {bank} account")
-            elif "through {bank}" in template:
-                template = template.replace("through {bank}", "through {bank} account")
-            elif "at {bank}" in template:
-                template = template.replace("at {bank}", "at {bank} account")
-            elif "to {bank}" in template:
-                template = template.replace("to {bank}", "to {bank} account")
-
-    sentence, tokens, token_labels = generate_BIO_tokens_from_template(
-        template,
-        tokenizer,
+    template, default_bank_template = rng.choice(compiled_request_money_templates)
+
+    if bank in ["default", "primary"]:
+        template = default_bank_template
+
+    entities = dict(
         amount=(amount, AMOUNT_ENTITY_LABEL),
         sender=(sender, USER_ENTITY_LABEL),
         bank=(bank, BANK_ENTITY_LABEL)
     )
-    
-    return sentence, tokens, token_labels
 
-def generate_request_money_intents_and_labelled_tokens(num_sentences, tokenizer):
+    return template, entities
+
+# generate both a sentence and the corresponding tokens
+def generate_request_money_sentence_and_tokens(tokenizer):
+    template, entities = pick_request_money_sample()
+    return template.render(tokenizer, **entities)
+
+def generate_request_money_intents_and_labelled_tokens(num_sentences, tokenizer, rng=random):
     return generate_grouped_intent_sentences_and_BIO_tokens(
         num_sentences,
         tokenizer,
         REQUEST_MONEY_INTENT_LABEL,
-        generate_request_money_sentence_and_tokens
+        pick_request_money_sample,
+        rng=rng
     )
\ No newline at end of file
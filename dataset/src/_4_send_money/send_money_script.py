@@ -1,12 +1,12 @@
 import random
-from utils.names_utils import names
+from utils.names_utils import user_names_pool
 from utils.bank_names_utils import bank_names
 from utils.amount_utils import random_amount
-from utils.utils import trim_punctuation, generate_BIO_tokens_from_template, \
+from utils.utils import trim_punctuation, CompiledTemplate, \
     generate_grouped_intent_sentences_and_BIO_tokens, \
     AMOUNT_ENTITY_LABEL, BANK_ENTITY_LABEL, USER_ENTITY_LABEL, SEND_MONEY_INTENT_LABEL
 
-recipient_names = names
+recipient_names = user_names_pool
 
 # Expanded set of templates
 send_money_templates = [
@@ -164,28 +164,41 @@ send_money_templates = [
     "Initiate a transaction.",
 ]
 
+# 'default' and 'primary' banks read better when followed by 'account'
+def adjust_template_for_default_bank(template):
+    if "{bank}" in template and "{bank} account" not in template:
+        if "using {bank}" in template:
+            template = template.replace("using {bank}", "using {bank} account")
+        elif "account at {bank}" in template:
+            template = template.replace("account at {bank}", "{bank} account")
+        elif "account with {bank}" in template:
+            template = template.replace("account with {bank}", "{bank} account")
+        elif "from {bank}" in template:
+            template = template.replace("from {bank}", "from my {bank} account")
+        elif "via {bank}" in template:
+            template = template.replace("via {bank}", "via {bank} account")
+        elif "through {bank}" in template:
+            template = template.replace("through {bank}", "through {bank} account")
+
+    return template
+
+# templates (without punctuation) parsed once, to render the labelled tokens: 
+# each one is paired with its variant for the 'default' and 'primary' banks
+compiled_send_money_templates = [
+    (CompiledTemplate(template), CompiledTemplate(adjust_template_for_default_bank(template)))
+    for template in map(trim_punctuation, send_money_templates)
+]
+
 # Function to generate a sentence
 def generate_send_money_sentence():
-    recipient = random.choice(recipient_names)
+    recipient = recipient_names.choice()
     bank = random.choice(bank_names)
     amount = random_amount()  # Using the random_amount function
     
     template = random.choice(send_money_templates)
 
-    if "{bank}" in template and bank in ["default", "primary"]:
-        if "{bank} account" not in template:
-            if "using {bank}" in template:
-                template = template.replace("using {bank}", "using {bank} account")
-            elif "account at {bank}" in template:
-                template = template.replace("account at {bank}", "{bank} account")
-            elif "account with {bank}" in template:
-                template = template.replace("account with {bank}", "{bank} account")
-            elif "from {bank}" in template:
-                template = template.replace("from {bank}", "from my {bank} account")
-            elif "via {bank}" in template:
-                template = template.replace("via {bank}", "via {bank} account")
-            elif "through {bank}" in template:
-                template = template.replace("through {bank}", "through {bank} account")
+    if bank in ["default", "primary"]:
+        template = adjust_template_for_default_bank(template)
 
     sentence = template.format(amount=amount, recipient=recipient, bank=bank)
 
@@ -198,44 +211,36 @@ def generate_send_money_dataset_of_at_most(num_sentences):
     unique_sentences = {generate_send_money_sentence() for _ in range(num_sentences)}
     return unique_sentences
 
-# generate both the sentence and the corresponding tokens
-def generate_send_money_sentence_and_tokens(tokenizer):
-    recipient = random.choice(recipient_names)
-    bank = random.choice(bank_names)
-    amount = random_amount()  
+# pick a random template and the entities to substitute to its placeholders
+def pick_send_money_sample(rng=random):
+    recipient = recipient_names.choice(rng)
+    bank = rng.choice(bank_names)
+    amount = random_amount(rng)  
     
-    template = trim_punctuation(random.choice(send_money_templates))
-
-    if "{bank}" in template and bank in ["default", "primary"]:
-        if "{bank} account" not in template:
-            if "using {bank}" in template:
-                template = template.replace("using {bank}", "using {bank} account")
-            elif "account at {bank}" in template:
-                template = template.replace("account at {bank}", "{bank} account")
-            elif "account with {bank}" in template:
-                template = template.replace("account with {bank}", "{bank} account")
-            elif "from {bank}" in template:
-                template = template.replace("from {bank}", "from my {bank} account")
-            elif "via {bank}" in template:
-                template = template.replace("via {bank}", "via {bank} account")
-            elif "through {bank}" in template:
-                template = template.replace("through {bank}", "through {bank} account")
-
-    sentence, tokens, token_labels = generate_BIO_tokens_from_template(
-        template,
-        tokenizer,
+    template, default_bank_template = rng.choice(compiled_send_money_templates)
+
+    if bank in ["default", "primary"]:
+        template = default_bank_template
+
+    entities = dict(
         amount=(amount, AMOUNT_ENTITY_LABEL), 
         recipient=(recipient, USER_ENTITY_LABEL),
         bank=(bank, BANK_ENTITY_LABEL)
     )
 
-    return sentence, tokens, token_labels
+    return template, entities
+
+# generate both the sentence and the corresponding tokens
+def generate_send_money_sentence_and_tokens(tokenizer):
+    template, entities = pick_send_money_sample()
+    return template.render(tokenizer, **entities)
 
 # generate the grouped (random) sentences + tokens + token labels
-def generate_send_money_intents_and_labelled_tokens(num_sentences, tokenizer):
+def generate_send_money_intents_and_labelled_tokens(num_sentences, tokenizer, rng=random):
     return generate_grouped_intent_sentences_and_BIO_tokens(
         num_sentences,
         tokenizer,
         SEND_MONEY_INTENT_LABEL,
-        generate_send_money_sentence_and_tokens
+        pick_send_money_sample,
+        rng=rng
     )
\ No newline at end of file
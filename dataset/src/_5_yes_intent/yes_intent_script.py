@@ -1,5 +1,5 @@
 import random
-from utils.utils import trim_punctuation, generate_BIO_tokens_from_template, \
+from utils.utils import trim_punctuation, CompiledTemplate, \
     generate_grouped_intent_sentences_and_BIO_tokens, \
     YES_INTENT_LABEL
 
@@ -106,6 +106,9 @@ yes_intent_templates = [
     "Do it",
 ]
 
+# sentences (without punctuation) parsed once, to render the labelled tokens
+compiled_yes_intent_templates = [CompiledTemplate(trim_punctuation(sentence)) for sentence in yes_intent_templates]
+
 
 def generate_yes_intent_dataset(num_sentences=3000):
     dataset = []
@@ -117,22 +120,22 @@ def generate_yes_intent_dataset(num_sentences=3000):
 
     return dataset
 
+# pick a random template and the entities to substitute to its placeholders
+def pick_yes_sample(rng=random):
+    template = rng.choice(compiled_yes_intent_templates)
+    return template, {}
+
 # generate both a sentence and its tokens
 def generate_yes_sentence_and_tokens(tokenizer):
-    sentence = trim_punctuation(random.choice(yes_intent_templates))
-    
-    sentence, tokens, labels = generate_BIO_tokens_from_template(
-        sentence,
-        tokenizer
-    )
-
-    return sentence, tokens, labels
+    template, entities = pick_yes_sample()
+    return template.render(tokenizer, **entities)
 
 # generate a certain number of sentences + tokens + labels
-def generate_yes_intents_and_labelled_tokens(num_sentences, tokenizer):
+def generate_yes_intents_and_labelled_tokens(num_sentences, tokenizer, rng=random):
     return generate_grouped_intent_sentences_and_BIO_tokens(
         num_sentences,
         tokenizer,
         YES_INTENT_LABEL,
-        generate_yes_sentence_and_tokens
+        pick_yes_sample,
+        rng=rng
     )
@@ -1,5 +1,5 @@
 import random
-from utils.utils import trim_punctuation, generate_BIO_tokens_from_template, \
+from utils.utils import trim_punctuation, CompiledTemplate, \
     generate_grouped_intent_sentences_and_BIO_tokens, NO_INTENT_LABEL
 
 no_intent_templates = [
@@ -107,6 +107,10 @@ no_intent_templates = [
     "I must say no.",
 ]
 
+# sentences (without punctuation) parsed once, to render the labelled tokens
+compiled_no_intent_templates = [CompiledTemplate(trim_punctuation(sentence)) for sentence in no_intent_templates]
+
+
 def generate_no_intent_dataset(num_sentences=3000):
     dataset = []
 
@@ -117,22 +121,22 @@ def generate_no_intent_dataset(num_sentences=3000):
 
     return dataset
 
+# pick a random template and the entities to substitute to its placeholders
+def pick_no_sample(rng=random):
+    template = rng.choice(compiled_no_intent_templates)
+    return template, {}
+
 # generate both a sentence and the corresponding tokens
 def generate_no_sentence_and_tokens(tokenizer):
-    sentence = trim_punctuation(random.choice(no_intent_templates))
-    
-    sentence, tokens, labels = generate_BIO_tokens_from_template(
-        sentence,
-        tokenizer
-    )
-
-    return sentence, tokens, labels
+    template, entities = pick_no_sample()
+    return template.render(tokenizer, **entities)
 
 # generate a certain number of sentences + tokens + labels
-def generate_no_intents_and_labelled_tokens(num_sentences, tokenizer):
+def generate_no_intents_and_labelled_tokens(num_sentences, tokenizer, rng=random):
     return generate_grouped_intent_sentences_and_BIO_tokens(
         num_sentences,
         tokenizer,
         NO_INTENT_LABEL,
-        generate_no_sentence_and_tokens
+        pick_no_sample,
+        rng=rng
     )
\ No newline at end of file
@@ -0,0 +1,210 @@
+import sys
+sys.dont_write_bytecode = True
+
+import argparse
+import atexit
+import importlib.util
+import os
+import random
+import re
+import shutil
+import tempfile
+
+from _1_check_balance.check_balance_script import generate_check_balance_sentence_and_tokens
+from _2_check_transactions.check_transactions_script import generate_check_transactions_sentence_and_tokens
+from _3_request_money.request_money_script import generate_request_money_sentence_and_tokens
+from _4_send_money.send_money_script import generate_send_money_sentence_and_tokens, pick_send_money_sample, \
+    generate_send_money_intents_and_labelled_tokens
+from _5_yes_intent.yes_intent_script import generate_yes_sentence_and_tokens
+from _6_no_intent.no_intent_script import generate_no_sentence_and_tokens
+from _0_none_intent.none_intent_script import generate_none_sentence_and_tokens
+from utils.utils import generate_BIO_tokens_from_template, trim_punctuation, write_grouped_intent_and_tokens_datasets
+from utils.amount_utils import random_amount, random_amounts_batch, generate_random_amount_sentence_and_tokens
+from utils.bank_names_utils import generate_bank_accounts_sentence_and_tokens
+from utils.names_utils import generate_random_names
+from utils.benchmark_utils import benchmark, benchmarks, run_benchmarks, save_results, load_results, compare_results, \
+    BENCHMARK_ROUNDS, BENCHMARK_MIN_TIME, REGRESSION_THRESHOLD
+from utils.wordpiece import WordPieceTokenizer
+from main import VOCAB_FILEPATH, INTENTS_GENERATION_FUNCTIONS
+
+# script substituting the names and the banks of the custom LM dataset with placeholders
+CUSTOM_LM_SCRIPT_FILEPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "customLMscripts", "main.py")
+
+def utf8_size(strings):
+    return sum(len(string.encode("utf-8")) for string in strings)
+
+@benchmark("generate_BIO_tokens_from_template")
+def bench_generate_BIO_tokens_from_template(tokenizer, num_samples=1000):
+    # (the raw string templates, as the callers outside of the intents scripts pass them)
+    samples = [(template.template, entities) for template, entities in (pick_send_money_sample() for _ in range(num_samples))]
+
+    def run():
+        sentences = [generate_BIO_tokens_from_template(template, tokenizer, **entities)[0] for template, entities in samples]
+        return num_samples, utf8_size(sentences)
+
+    return run
+
+@benchmark("random_amount")
+def bench_random_amount(tokenizer, num_samples=10000):
+    def run():
+        amounts = [random_amount() for _ in range(num_samples)]
+        return num_samples, utf8_size(amounts)
+
+    return run
+
+@benchmark("random_amounts_batch")
+def bench_random_amounts_batch(tokenizer, num_samples=10000):
+    def run():
+        return num_samples, utf8_size(random_amounts_batch(num_samples))
+
+    return run
+
+@benchmark("generate_random_names")
+def bench_generate_random_names(tokenizer, names_per_type=200):
+    def run():
+        names = generate_random_names(
+            english_first_names=names_per_type,
+            english_full_names=names_per_type,
+            italian_first_names=names_per_type,
+            italian_full_names=names_per_type,
+            common_names=names_per_type
+        )
+        return len(names), utf8_size(names)
+
+    return run
+
+def sentence_and_tokens_benchmark(generation_function, num_samples=500):
+    def setup(tokenizer):
+        def run():
+            sentences = [generation_function(tokenizer)[0] for _ in range(num_samples)]
+            return num_samples, utf8_size(sentences)
+
+        return run
+
+    return setup
+
+for generation_function in [generate_check_balance_sentence_and_tokens, generate_check_transactions_sentence_and_tokens,
+                            generate_request_money_sentence_and_tokens, generate_send_money_sentence_and_tokens,
+                            generate_yes_sentence_and_tokens, generate_no_sentence_and_tokens, generate_none_sentence_and_tokens,
+                            generate_bank_accounts_sentence_and_tokens, generate_random_amount_sentence_and_tokens]:
+    benchmark(generation_function.__name__)(sentence_and_tokens_benchmark(generation_function))
+
+def intents_and_labelled_tokens_benchmark(generation_function, num_samples=2000):
+    def setup(tokenizer):
+        def run():
+            sentences = [sentence for sentence, _, _, _ in generation_function(num_samples, tokenizer, random.Random(0))]
+            return len(sentences), utf8_size(sentences)
+
+        return run
+
+    return setup
+
+# (batched generation of each intent dataset, as done by main.py)
+for generation_function in INTENTS_GENERATION_FUNCTIONS.values():
+    benchmark(generation_function.__name__)(intents_and_labelled_tokens_benchmark(generation_function))
+
+@benchmark("trim_punctuation")
+def bench_trim_punctuation(tokenizer, num_samples=10000):
+    # quoted sentences with commas and a final punctuation mark, as formatted by the templates
+    sentences = ["\"%s, please%s\"" % (generate_send_money_sentence_and_tokens(tokenizer)[0], random.choice("?."))
+                 for _ in range(num_samples)]
+    num_bytes = utf8_size(sentences)
+
+    def run():
+        for sentence in sentences:
+            trim_punctuation(sentence)
+        return num_samples, num_bytes
+
+    return run
+
+@benchmark("write_grouped_intent_and_tokens_datasets")
+def bench_write_grouped_intent_and_tokens_datasets(tokenizer, num_samples=5000):
+    elements = list(generate_send_money_intents_and_labelled_tokens(num_samples, tokenizer, random.Random(0)))
+    output_dirpath = tempfile.mkdtemp(prefix="benchmark-")
+    atexit.register(shutil.rmtree, output_dirpath, ignore_errors=True)
+    intents_filepath = os.path.join(output_dirpath, "intents.csv")
+    ner_filepath = os.path.join(output_dirpath, "named_entities.csv")
+
+    def run():
+        write_grouped_intent_and_tokens_datasets(elements, intents_filepath, ner_filepath)
+        return num_samples, os.path.getsize(intents_filepath) + os.path.getsize(ner_filepath)
+
+    return run
+
+def import_custom_lm_script():
+    # the custom LM script imports its modules (names, banks, gazetteer, ...) as top-level modules of its directory:
+    # the directory is in the search path only during the import, and those modules are then removed from
+    # sys.modules as well (the script keeps its references), not to shadow any other module with the same name
+    scripts_dirpath = os.path.dirname(CUSTOM_LM_SCRIPT_FILEPATH)
+    sys.path.insert(0, scripts_dirpath)
+
+    try:
+        spec = importlib.util.spec_from_file_location("custom_lm_main", CUSTOM_LM_SCRIPT_FILEPATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(scripts_dirpath)
+
+        for name, imported_module in list(sys.modules.items()):
+            module_filepath = getattr(imported_module, "__file__", None) or ""
+            if os.path.dirname(os.path.abspath(module_filepath)) == os.path.abspath(scripts_dirpath):
+                del sys.modules[name]
+
+    return module
+
+@benchmark("custom_lm_substitute_placeholders")
+def bench_custom_lm_substitute_placeholders(tokenizer, num_lines=1000):
+    custom_lm_script = import_custom_lm_script()
+
+    with open(os.path.join(os.path.dirname(CUSTOM_LM_SCRIPT_FILEPATH), "intents.csv"), "r") as file:
+        lines = [line for _, line in zip(range(num_lines), file)]
+
+    num_bytes = utf8_size(lines)
+
+    def run():
+        for line in lines:
+            custom_lm_script.substitute_placeholders(line)
+        return len(lines), num_bytes
+
+    return run
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the throughput (samples/sec and bytes/sec) of the dataset generation")
+    parser.add_argument("--vocab-file", default=VOCAB_FILEPATH, help="vocab.txt of the (uncased) BERT tokenizer")
+    parser.add_argument("--filter", default=None, help="only run the benchmarks whose name matches this regex")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    parser.add_argument("--rounds", type=int, default=BENCHMARK_ROUNDS, help="number of timed rounds of each benchmark")
+    parser.add_argument("--min-time", type=float, default=BENCHMARK_MIN_TIME, help="minimum duration of a round (in seconds)")
+    parser.add_argument("--output", default="./benchmark_results.json", help="JSON file of the results")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run: exit with an error if a throughput regressed")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative throughput drop reported as a regression (with --compare)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    names = [name for name in benchmarks if args.filter is None or re.search(args.filter, name)]
+
+    if args.list:
+        print("\n".join(names))
+        return
+
+    tokenizer = WordPieceTokenizer.from_vocab_file(args.vocab_file)
+    report = run_benchmarks(names, (tokenizer,), args.rounds, args.min_time)
+    save_results(report, args.output)
+    print("Results saved in %s" % args.output)
+
+    if args.compare is not None:
+        regressions = compare_results(load_results(args.compare), report, args.threshold)
+
+        for name, metric, old_value, new_value, change in regressions:
+            print("REGRESSION %s: %s %.1f -> %.1f (%+.1f%%)" % (name, metric, old_value, new_value, change * 100))
+
+        if len(regressions) > 0:
+            sys.exit(1)
+
+        print("No regressions with respect to %s" % args.compare)
+
+
+if __name__ == "__main__":
+    main()
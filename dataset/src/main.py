@@ -1,7 +1,14 @@
 import sys 
 sys.dont_write_bytecode = True
 
-from transformers import AutoTokenizer, BertTokenizer
+import argparse
+import math
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 from _1_check_balance.check_balance_script import generate_check_balance_intents_and_labelled_tokens
 from _2_check_transactions.check_transactions_script import generate_check_transactions_intents_and_labelled_tokens
 from _3_request_money.request_money_script import generate_request_money_intents_and_labelled_tokens
@@ -9,39 +16,328 @@ from _4_send_money.send_money_script import generate_send_money_intents_and_labe
 from _5_yes_intent.yes_intent_script import generate_yes_intents_and_labelled_tokens
 from _6_no_intent.no_intent_script import generate_no_intents_and_labelled_tokens
 from _0_none_intent.none_intent_script import generate_none_intents_and_labelled_tokens_including_entities
-from utils.utils import write_grouped_intent_and_tokens_datasets
-import random
+from utils.utils import write_grouped_intent_and_tokens_datasets, write_grouped_tensors_dataset, IntentMixer, GroupedDatasetsCsvWriter, \
+    DEFAULT_MAX_SEQ_LEN, CHECK_BALANCE_INTENT_LABEL, CHECK_TRANSACTIONS_INTENT_LABEL, REQUEST_MONEY_INTENT_LABEL, SEND_MONEY_INTENT_LABEL, \
+    YES_INTENT_LABEL, NO_INTENT_LABEL, NONE_INTENT_LABEL
+from utils.names_utils import user_names_pool
+from utils.shuffle_utils import external_shuffle
+from utils.arrow_utils import write_grouped_intent_and_tokens_arrow
+from utils.sharding_utils import write_sharded_grouped_datasets
+from utils.cache_utils import ShardCache, intent_inputs_hash, tokenizer_fingerprint
+from utils.parallel_utils import init_worker, generate_intent_shards, shard_seed
+from utils.instrumentation_utils import RunInstrumentation
+from utils.profiling_utils import profiling, PROFILING_MODES, PROFILE_MODE_ENV_VARIABLE, PROFILE_OUTPUT_ENV_VARIABLE
+from utils.wordpiece import WordPieceTokenizer
 
-if __name__ == "__main__":
-    tokenizer: BertTokenizer = AutoTokenizer.from_pretrained("bert-base-uncased")
-    num_sentences = 3000
-    
-    _0_check_balance_dataset = generate_check_balance_intents_and_labelled_tokens(num_sentences, tokenizer)
-    _1_check_transactions_dataset = generate_check_transactions_intents_and_labelled_tokens(num_sentences, tokenizer)
-    _2_request_money_dataset = generate_request_money_intents_and_labelled_tokens(num_sentences, tokenizer)
-    _3_send_money_dataset = generate_send_money_intents_and_labelled_tokens(num_sentences, tokenizer)
-    _4_yes_dataset = generate_yes_intents_and_labelled_tokens(num_sentences, tokenizer)
-    _5_no_dataset = generate_no_intents_and_labelled_tokens(num_sentences, tokenizer)
-    _6_none_dataset = generate_none_intents_and_labelled_tokens_including_entities(num_sentences * 4, tokenizer)
-
-    # put sentences altogether 
-    complete_dataset = _0_check_balance_dataset      + \
-                       _1_check_transactions_dataset + \
-                       _2_request_money_dataset      + \
-                       _3_send_money_dataset         + \
-                       _4_yes_dataset                + \
-                       _5_no_dataset                 + \
-                       _6_none_dataset
-    # shuffle them
-    random.shuffle(complete_dataset)
-    
-    # write the dataset to 2 csv files
-    write_grouped_intent_and_tokens_datasets(
-        complete_dataset,
-        "./final_dataset/intents.csv",
-        "./final_dataset/named_entities.csv"
-    )
+# vocab of the BERT (uncased) preprocessor used on device by the Voice Assistant
+VOCAB_FILEPATH = "../../PaymentsVocalAssistant/PaymentsVocalAssistant/ConversationManager/VocalAssistantDst/" + \
+                 "IntentAndEntitiesExtractor/BertIntentAndEntitiesExtractor/BertTextClassifier/Resources/vocab.txt"
+
+# functions generating the dataset of each intent
+INTENTS_GENERATION_FUNCTIONS = {
+    CHECK_BALANCE_INTENT_LABEL:         generate_check_balance_intents_and_labelled_tokens,
+    CHECK_TRANSACTIONS_INTENT_LABEL:    generate_check_transactions_intents_and_labelled_tokens,
+    REQUEST_MONEY_INTENT_LABEL:         generate_request_money_intents_and_labelled_tokens,
+    SEND_MONEY_INTENT_LABEL:            generate_send_money_intents_and_labelled_tokens,
+    YES_INTENT_LABEL:                   generate_yes_intents_and_labelled_tokens,
+    NO_INTENT_LABEL:                    generate_no_intents_and_labelled_tokens,
+    NONE_INTENT_LABEL:                  generate_none_intents_and_labelled_tokens_including_entities
+}
+
+# default share of each intent in the dataset (3000 sentences for each intent, and 4 times as many for none)
+DEFAULT_INTENTS_RATIOS = {intent: 1 for intent in INTENTS_GENERATION_FUNCTIONS}
+DEFAULT_INTENTS_RATIOS[NONE_INTENT_LABEL] = 4
+DEFAULT_NUM_SENTENCES = 3000 * sum(DEFAULT_INTENTS_RATIOS.values())
+
+def parse_intents_values(text, defaults, value_type, value_name):
+    """
+    Parse a list of per-intent values in the form "intent=value,...": the intents not listed keep their default value
+    """
+    values = dict(defaults)
+
+    for item in filter(None, map(str.strip, text.split(","))):
+        intent, _, value = item.partition("=")
+        intent = intent.strip()
+
+        if intent not in values:
+            raise argparse.ArgumentTypeError("unknown intent '%s' (expected one of %s)" % (intent, ", ".join(values)))
+
+        try:
+            values[intent] = value_type(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError("invalid %s '%s' for intent '%s'" % (value_name, value, intent))
+
+        if values[intent] < 0:
+            raise argparse.ArgumentTypeError("negative %s for intent '%s'" % (value_name, intent))
+
+    if sum(values.values()) == 0:
+        # (the values are normalised by their total)
+        raise argparse.ArgumentTypeError("the %ss of all the intents are zero" % value_name)
+
+    return values
+
+def parse_intents_ratios(text):
+    return parse_intents_values(text, DEFAULT_INTENTS_RATIOS, float, "ratio")
+
+def parse_intents_counts(text):
+    default_counts = {intent: 3000 * ratio for intent, ratio in DEFAULT_INTENTS_RATIOS.items()}
+    return parse_intents_values(text, default_counts, int, "count")
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the intents and named entities datasets")
+
+    size_group = parser.add_argument_group("dataset size and balance")
+    size_group.add_argument("--num-sentences", type=int, default=DEFAULT_NUM_SENTENCES, help="total number of sentences")
+    size_group.add_argument("--intents-ratios", type=parse_intents_ratios, default=DEFAULT_INTENTS_RATIOS,
+                            help="relative share of the intents, e.g. 'yes=0.5,none=2' (the others keep their default ratio)")
+    size_group.add_argument("--counts", type=parse_intents_counts, default=None,
+                            help="exact number of sentences of the intents, e.g. 'send_money=5000,none=20000' (the others keep " +
+                                 "their default count: 3000, 12000 for none); overrides --num-sentences and --intents-ratios")
+    size_group.add_argument("--mixing", choices=IntentMixer.METHODS, default="sampling", 
+                            help="how the intents are interleaved: random sampling or (deterministic) weighted round-robin")
+    size_group.add_argument("--seed", type=int, default=0, help="seed of the random generation")
+    size_group.add_argument("--names-pool-size", type=int, default=user_names_pool.size, help="number of users names used by the intents")
+
+    tokenizer_group = parser.add_argument_group("tokenizer")
+    tokenizer_group.add_argument("--vocab-file", default=VOCAB_FILEPATH, help="vocab.txt of the (uncased) BERT tokenizer")
+    tokenizer_group.add_argument("--hf-tokenizer", default=None, 
+                                 help="name of a HuggingFace tokenizer to be used instead of the vocab file (requires transformers)")
+
+    output_group = parser.add_argument_group("output")
+    output_group.add_argument("--output-dir", default="./final_dataset", help="directory of the generated files")
+    output_group.add_argument("--format", choices=["csv", "arrow", "npy"], default="csv", 
+                              help="output format: the intents and named entities csv files, one Arrow file with a row per sentence, " + 
+                                   "or pre-tensorized .npy arrays (input ids, attention mask, NER and intent labels)")
+    output_group.add_argument("--compression", choices=["none", "gz", "zst"], default="none", help="compression of the csv files")
+    output_group.add_argument("--output-shards", type=int, default=1, 
+                              help="number of (size-balanced) csv shards, described by a JSON manifest (1 to write the two csv files)")
+    output_group.add_argument("--max-seq-len", type=int, default=DEFAULT_MAX_SEQ_LEN, help="length of the sequences of the npy format")
+
+    execution_group = parser.add_argument_group("execution")
+    execution_group.add_argument("--workers", type=int, default=1, help="number of worker processes generating the shards")
+    execution_group.add_argument("--shards", type=int, default=8, help="number of shards each intent dataset is split in")
+    execution_group.add_argument("--prefetch", type=int, default=None, 
+                                 help="number of shards of each intent generated in advance by the worker processes " + 
+                                      "(default: enough to keep all the workers busy, ceil(workers / intents) + 1)")
+    execution_group.add_argument("--cache-dir", default=None, 
+                                 help="incremental mode: reuse the shards of the intents whose inputs (templates, entities, code, " + 
+                                      "seed, count) did not change, cached in this directory")
+    execution_group.add_argument("--shuffle-memory-budget", type=int, default=0, 
+                                 help="shuffle the mixed dataset again, spilling runs of this size (in MB) to disk (0 to disable)")
+    execution_group.add_argument("--shuffle-temp-dir", default=None, help="directory of the shuffle runs (default: the system temp dir)")
+    execution_group.add_argument("--dry-run", action="store_true", 
+                                 help="do not generate the dataset: print a capacity report (sizes, disk space and time estimates)")
+
+    instrumentation_group = parser.add_argument_group("instrumentation")
+    instrumentation_group.add_argument("--run-report", default=None, 
+                                       help="measure each stage (wall time, samples/sec, tokenizer calls, peak memory) and " + 
+                                            "write a JSON run report to this file, showing the progress of each intent")
+    instrumentation_group.add_argument("--trace-memory", action="store_true", 
+                                       help="also trace the peak memory allocated by each stage with tracemalloc (slower)")
+    instrumentation_group.add_argument("--no-progress", action="store_true", help="do not show the progress line (with --run-report)")
+    instrumentation_group.add_argument("--profile", choices=PROFILING_MODES, default=os.environ.get(PROFILE_MODE_ENV_VARIABLE) or None,
+                                       help="profile the run (not the worker processes) with cProfile (pstats output) or with a " + 
+                                            "sampling profiler (collapsed stacks output); default: $%s" % PROFILE_MODE_ENV_VARIABLE)
+    instrumentation_group.add_argument("--profile-output", default=os.environ.get(PROFILE_OUTPUT_ENV_VARIABLE) or None,
+                                       help="path of the profile, without extension (default: $%s, or profile in the output dir)" % 
+                                            PROFILE_OUTPUT_ENV_VARIABLE)
+
+    args = parser.parse_args(argv)
+
+    if args.counts is not None:
+        # the exact counts are obtained as ratios of their total
+        args.intents_ratios = args.counts
+        args.num_sentences = sum(args.counts.values())
+
+    for name in ["num_sentences", "workers", "shards", "output_shards", "max_seq_len", "names_pool_size"]:
+        if getattr(args, name) < (3 if name == "max_seq_len" else 1):
+            parser.error("invalid value of --%s: %d" % (name.replace("_", "-"), getattr(args, name)))
+
+    if args.prefetch is not None and args.prefetch < 1:
+        parser.error("invalid value of --prefetch: %d" % args.prefetch)
+
+    return args
+
+def load_tokenizer(args):
+    if args.hf_tokenizer is not None:
+        # transformers is only needed to use a different tokenizer
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(args.hf_tokenizer)
+
+    # same tokens as AutoTokenizer.from_pretrained("bert-base-uncased"), without loading transformers
+    return WordPieceTokenizer.from_vocab_file(args.vocab_file)
+
+def output_filepaths(args):
+    """
+    - output: the files (or directories) to be written, according to the output format
+    """
+    if args.format == "arrow":
+        return [os.path.join(args.output_dir, "dataset.arrow")]
+
+    if args.format == "npy":
+        return [os.path.join(args.output_dir, "tensors")]
+
+    if args.output_shards > 1:
+        return [os.path.join(args.output_dir, "shards")]
 
+    compression_extension = "" if args.compression == "none" else "." + args.compression
+    return [os.path.join(args.output_dir, "intents.csv" + compression_extension),
+            os.path.join(args.output_dir, "named_entities.csv" + compression_extension)]
 
-   
+def print_capacity_report(args, tokenizer, mixer, sample_size=256):
+    """
+    Estimate the size of the dataset and the generation time, generating a small sample of each intent
+    """
+    counts = mixer.counts()
+    rows = []
+
+    with GroupedDatasetsCsvWriter(os.devnull, os.devnull) as writer:
+        for intent, count in counts.items():
+            num_samples = min(count, sample_size)
+            num_tokens = 0
+            num_chars = 0
+            sentences = set()
+
+            start_time = time.perf_counter()
+            for element in INTENTS_GENERATION_FUNCTIONS[intent](num_samples, tokenizer, random.Random(shard_seed(args.seed, intent, 0))):
+                num_tokens += len(element[2])
+                num_chars += writer.write(element)
+                sentences.add(element[0])
+            elapsed_time = time.perf_counter() - start_time
+
+            scale = count / max(num_samples, 1)
+            rows.append((intent, count, min(args.shards, count), num_tokens * scale, num_chars * scale, elapsed_time * scale,
+                         len(sentences) / max(num_samples, 1)))
+
+    total_count = sum(row[1] for row in rows)
+    total_tokens = sum(row[3] for row in rows)
+    total_chars = sum(row[4] for row in rows)
+    total_time = sum(row[5] for row in rows)
+
+    print("Capacity report (estimated from %d samples per intent)" % sample_size)
+    print("%-20s %10s %7s %7s %12s %10s %9s %8s" % ("intent", "sentences", "share", "shards", "tokens", "csv MB", "time (s)", "unique"))
+
+    for intent, count, shards, num_tokens, num_chars, elapsed_time, unique_share in rows:
+        print("%-20s %10d %6.1f%% %7d %12d %10.1f %9.1f %7.0f%%" % (intent, count, 100 * count / max(total_count, 1), shards,
+                                                                    num_tokens, num_chars / 2**20, elapsed_time, 100 * unique_share))
+
+    print("%-20s %10d %7s %7s %12d %10.1f %9.1f" % ("total", total_count, "", "", total_tokens, total_chars / 2**20, total_time))
+
+    if args.format == "npy":
+        # 4 arrays of int32
+        print("npy arrays size: %.1f MB" % (total_count * (3 * args.max_seq_len + 1) * 4 / 2**20))
+
+    print("estimated generation time with %d worker(s): %.1f s (the csv writing is not parallel)" % (args.workers, total_time / args.workers))
+
+    existing_dirpath = os.path.abspath(args.output_dir)
+    while not os.path.exists(existing_dirpath):
+        existing_dirpath = os.path.dirname(existing_dirpath)
+
+    free_space = shutil.disk_usage(existing_dirpath).free
+    print("free disk space in %s: %.1f MB (%s)" % (existing_dirpath, free_space / 2**20, 
+                                                    "enough" if free_space > total_chars else "NOT ENOUGH for the uncompressed csv files"))
+    print("output: %s" % ", ".join(output_filepaths(args)))
+
+def write_complete_dataset(args, complete_dataset, tokenizer, output_paths):
+    """
+    Write the (lazily generated) complete dataset in the output format
+    """
+    if args.format == "arrow":
+        # write the dataset to a single (memory-mappable) Arrow file
+        write_grouped_intent_and_tokens_arrow(complete_dataset, output_paths[0])
+    elif args.format == "npy":
+        # write the dataset as padded (memory-mappable) arrays, ready to be fed to the model
+        write_grouped_tensors_dataset(complete_dataset, args.num_sentences, tokenizer, output_paths[0], args.max_seq_len)
+    elif args.output_shards > 1:
+        # write the dataset to size-balanced shards, to be read concurrently
+        compression_extension = "" if args.compression == "none" else "." + args.compression
+        write_sharded_grouped_datasets(complete_dataset, output_paths[0], args.output_shards, compression_extension)
+    else:
+        # write the dataset to 2 csv files
+        write_grouped_intent_and_tokens_datasets(complete_dataset, *output_paths)
+
+def generate(args):
+    # (when disabled, the instrumentation leaves the tokenizer and the datasets streams as they are)
+    instrumentation = RunInstrumentation(enabled=args.run_report is not None, progress=not args.no_progress, 
+                                         trace_memory=args.trace_memory)
+
+    with instrumentation.stage("load_tokenizer"):
+        tokenizer = instrumentation.wrap_tokenizer(load_tokenizer(args))
+
+    # the users names are picked (lazily) from the same seed
+    user_names_pool.configure(size=args.names_pool_size, seed=args.seed)
+
+    # (each stage has its own seed, derived from the global one: their random streams are independent)
+    mixer = IntentMixer(args.intents_ratios, args.num_sentences, args.mixing, random.Random(shard_seed(args.seed, "mix", 0)))
+
+    if args.dry_run:
+        print_capacity_report(args, tokenizer, mixer)
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    executor = None
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(tokenizer, user_names_pool))
+
+    try:
+        cache = None
+        if args.cache_dir is not None:
+            cache = ShardCache(args.cache_dir)
+            # the tokens (and the users names) do not depend on the intents sources only
+            cache_parameters = dict(tokenizer=tokenizer_fingerprint(tokenizer), names_pool=[user_names_pool.size, user_names_pool.seed])
+
+        # each dataset is a generator, lazily producing its sentences (shard by shard), 
+        # and its output only depends on the seed and the number of shards
+        intents_datasets = {}
+        # (the intents are consumed together: the shards prefetched by all of them keep the workers busy)
+        num_intents = sum(1 for count in mixer.counts().values() if count > 0)
+        prefetch = args.prefetch or math.ceil(args.workers / max(num_intents, 1)) + 1
+
+        for intent, num_intent_sentences in mixer.counts().items():
+            generation_function = INTENTS_GENERATION_FUNCTIONS[intent]
+            cache_key = None
+
+            if cache is not None:
+                cache_key = intent_inputs_hash(generation_function, num_intent_sentences, args.seed, args.shards, **cache_parameters)
+                cache.prune(intent, cache_key)
+
+            intents_datasets[intent] = generate_intent_shards(generation_function, num_intent_sentences, tokenizer, intent, args.seed, 
+                                                              num_shards=args.shards, executor=executor, prefetch=prefetch, 
+                                                              cache=cache, cache_key=cache_key)
+            intents_datasets[intent] = instrumentation.instrument_stream(intent, intents_datasets[intent], num_intent_sentences)
+
+        # put sentences altogether, interleaving the intents according to their ratios (without keeping the whole dataset in memory)
+        complete_dataset = instrumentation.instrument_stream("mix", mixer.mix(intents_datasets))
+
+        if args.shuffle_memory_budget > 0:
+            # shuffle the whole stream with bounded memory (e.g. if its streams are not independent samples)
+            complete_dataset = external_shuffle(complete_dataset, args.shuffle_memory_budget * 2**20, 
+                                                random.Random(shard_seed(args.seed, "shuffle", 0)), args.shuffle_temp_dir, tokenizer)
+            complete_dataset = instrumentation.instrument_stream("shuffle", complete_dataset)
     
+        output_paths = output_filepaths(args)
+
+        # (the samples actually written are counted, as they reach the writer)
+        complete_dataset = instrumentation.instrument_stream("write", complete_dataset, timed=False)
+
+        with instrumentation.stage("write"):
+            write_complete_dataset(args, complete_dataset, tokenizer, output_paths)
+    finally:
+        if executor is not None:
+            # (also if the generation fails: the pending shards are cancelled and the workers stopped)
+            executor.shutdown(cancel_futures=True)
+
+    if args.run_report is not None:
+        instrumentation.save_report(args.run_report, arguments=vars(args),
+                                    tokenizer_calls_scope="all" if executor is None else "main process only (not the workers)",
+                                    generation_functions={intent: INTENTS_GENERATION_FUNCTIONS[intent].__name__ for intent in intents_datasets})
+
+def main(argv=None):
+    args = parse_arguments(argv)
+
+    with profiling(args.profile, args.profile_output or os.path.join(args.output_dir, "profile")):
+        generate(args)
+
+if __name__ == "__main__":
+    main()
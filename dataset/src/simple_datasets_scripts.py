@@ -9,18 +9,26 @@ from utils.utils import write_dataset
 from utils.amount_utils import generate_random_amounts
 from utils.names_utils import generate_random_names
 from utils.bank_names_utils import generate_bank_accounts_dataset
+import argparse
+import os
 import random
 
 
+def retain_sentences(unique_sentences, num_sentences):
+    """
+    Retain (at most) num_sentences random sentences of a set, in a random order: the set is sorted first,
+    so that the result only depends on the state of the random module (not on the iteration order of the
+    set, which changes with the hash seed of each run)
+    """
+    sentences = sorted(unique_sentences)
+    return random.sample(sentences, min(num_sentences, len(sentences)))
+
 def run_send_money_script():
     # generate sentences
     dataset = generate_send_money_dataset_of_at_most(4000)
 
     # retain just 3000 sentences
-    num_sentences = 3000
-
-    if len(dataset) > num_sentences:
-        dataset = list(dataset)[:num_sentences]
+    dataset = retain_sentences(dataset, 3000)
         
     write_dataset(dataset, "./send_money/send_money_intent_dataset.csv")   
 
@@ -29,10 +37,7 @@ def run_request_money_script():
     dataset = generate_request_money_dataset_of_at_most(4000)
 
     # retain just 3000 sentences
-    num_sentences = 3000
-
-    if len(dataset) > num_sentences:
-        dataset = list(dataset)[:num_sentences]
+    dataset = retain_sentences(dataset, 3000)
         
     write_dataset(dataset, "./request_money/request_money_intent_dataset.csv")   
 
@@ -41,10 +46,7 @@ def run_check_balance_script():
     dataset = generate_check_balance_dataset_of_at_most(15000)
 
     # retain just 3000 sentences
-    num_sentences = 3000
-
-    if len(dataset) > num_sentences:
-        dataset = list(dataset)[:num_sentences]
+    dataset = retain_sentences(dataset, 3000)
 
     write_dataset(dataset, "./check_balance/check_balance_intent_dataset.csv")
 
@@ -52,11 +54,8 @@ def run_check_transactions_script():
     # generate sentences
     dataset = generate_check_transactions_dataset_of_at_most(4000)
 
-    # retain just 3000 sentences
-    num_sentences = 3000
-
-    if len(dataset) > num_sentences:
-        dataset = list(dataset)[:num_sentences]
+    # retain just 3000 sentences
+    dataset = retain_sentences(dataset, 3000)
 
     write_dataset(dataset, "./check_transactions/check_transactions_intent_dataset.csv")
 
@@ -86,7 +85,7 @@ def run_no_intent_script():
 
 def run_util():
     file = open("additional_deny_sentences.csv")
-    sentences = list({
+    sentences = sorted({
         line.strip().removeprefix("'").removeprefix("\"").removesuffix("'").removesuffix("\"")
         for i,line in enumerate(file)
         if i > 0
@@ -126,15 +125,39 @@ def run_spare_entities_script():
     write_dataset(accounts, "./null_intent/accounts_sentences.csv")
     
 
+# steps that can be run from the command line
+SCRIPTS = {
+    "send_money": run_send_money_script,
+    "request_money": run_request_money_script,
+    "check_balance": run_check_balance_script,
+    "check_transactions": run_check_transactions_script,
+    "null_intent": run_null_intent_script,
+    "yes_intent": run_yes_intent_script,
+    "no_intent": run_no_intent_script,
+    "spare_entities": run_spare_entities_script
+}
+
 if __name__ == "__main__":
-    # run_send_money_script()
-    # run_request_money_script()
-    # run_check_balance_script()
-    # run_check_transactions_script()
-    # run_null_intent_script()
-    # run_yes_intent_script()
-    # run_no_intent_script()
-    # run_spare_entities_script()
-    pass
-    
+    parser = argparse.ArgumentParser(description="Generate the simple (sentences only) datasets of the intents")
+    parser.add_argument("scripts", nargs="*", metavar="script", help="the datasets to be generated, among: %s" % ", ".join(SCRIPTS))
+    parser.add_argument("--all", action="store_true", help="generate all the datasets")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random generation")
+    parser.add_argument("--output-dir", default=".", help="directory where the datasets folders are written")
+    args = parser.parse_args()
+
+    if not args.all and len(args.scripts) == 0:
+        parser.error("no dataset to be generated: give some scripts (among: %s) or --all" % ", ".join(SCRIPTS))
+
+    for name in args.scripts:
+        if name not in SCRIPTS:
+            parser.error("unknown script '%s' (choose among: %s)" % (name, ", ".join(SCRIPTS)))
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    # (the datasets paths are relative)
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.chdir(args.output_dir)
 
+    for name in (list(SCRIPTS) if args.all else args.scripts):
+        SCRIPTS[name]()
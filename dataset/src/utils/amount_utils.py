@@ -1,80 +1,151 @@
 import random
-from utils.utils import generate_BIO_tokens_from_template, generate_grouped_intent_sentences_and_BIO_tokens, \
-    AMOUNT_ENTITY_LABEL, NONE_INTENT_LABEL
+import numpy as np
+from utils.utils import CompiledTemplate, generate_grouped_intent_sentences_and_BIO_tokens, register_entity_pool, \
+    BIO_BATCH_SIZE, AMOUNT_ENTITY_LABEL, CURRENCY_ENTITY_LABEL, NONE_INTENT_LABEL
 
 literal_digits = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine"]
 currencies_symbols = ["$", "€", "£", "AED"]
 currencies_literals = ["dollars", "euros", "pounds", "dirhams"]
 
+# currencies are tokenized just once (amounts are not, as they are almost all different)
+register_entity_pool(CURRENCY_ENTITY_LABEL, currencies_symbols + currencies_literals)
+
+amount_template = CompiledTemplate("{amount}")
+
 # Function to generate a random amount, sometimes with cents, sometimes without
-def random_amount():
-    whole_amount = random.randint(1, 500)
-    cents = random.randint(0, 99)
+def random_amount(rng=random):
+    whole_amount = rng.randint(1, 500)
+    cents = rng.randint(0, 99)
 
     # half of the integer amounts between 1 and 9 are converted into literal digits with a literal currency
-    if whole_amount < 10 and random.choice([True, False]):
-        amount = literal_digits[whole_amount] + " " + random.choice(currencies_literals)
+    if whole_amount < 10 and rng.choice([True, False]):
+        amount = literal_digits[whole_amount] + " " + rng.choice(currencies_literals)
         if whole_amount == 1:
             amount = amount[:-1] # remove trailing 's'
 
         if cents > 0:
-            cents_str = literal_digits[cents] if cents < 10 and random.choice([True, False]) else str(cents)
+            cents_str = literal_digits[cents] if cents < 10 and rng.choice([True, False]) else str(cents)
             amount += " and %s cents" % cents_str
             if cents == 1:
                 amount = amount[:-1]    # remove trailing 's'        
     else:
-        if random.choice([True, False]):
+        if rng.choice([True, False]):
             # put numerical cents
             amount = f"{whole_amount}.{str(cents).zfill(2)}"
 
             # Randomly choose between symbol or literal currency
-            if random.choice([True, False]):
-                amount = random.choice(currencies_symbols) + amount
+            if rng.choice([True, False]):
+                amount = rng.choice(currencies_symbols) + amount
             else:
-                amount = amount + " " + random.choice(currencies_literals)
+                amount = amount + " " + rng.choice(currencies_literals)
 
         else:
             # put literal cents
             
             # Randomly choose between symbol or literal currency
-            if random.choice([True, False]):
-                amount = random.choice(currencies_symbols) + str(whole_amount)
+            if rng.choice([True, False]):
+                amount = rng.choice(currencies_symbols) + str(whole_amount)
             else:
-                amount = str(whole_amount) + " " + random.choice(currencies_literals)
+                amount = str(whole_amount) + " " + rng.choice(currencies_literals)
 
             if cents > 0:
-                cents_str = literal_digits[cents] if cents < 10 and random.choice([True, False]) else str(cents)
+                cents_str = literal_digits[cents] if cents < 10 and rng.choice([True, False]) else str(cents)
                 amount += " and %s cents" % cents_str
                 if cents == 1:
                     amount = amount[:-1]    # remove trailing 's' 
 
     return amount
 
+# lookup tables of the pieces of the amounts, used by random_amounts_batch() (object arrays, so they can be
+# indexed with the arrays of random choices and concatenated element-wise)
+max_whole_amount = 500
+whole_amounts_strings = np.array([str(i) for i in range(max_whole_amount + 1)], dtype=object)
+literal_whole_amounts_strings = np.array(literal_digits + [""] * (max_whole_amount + 1 - len(literal_digits)), dtype=object)
+decimal_cents_strings = np.array([".%s" % str(i).zfill(2) for i in range(100)], dtype=object)
+
+# cents after the currency: index = cents (numerical) or 100 + cents (literal, only for cents < 10)
+cents_suffixes = np.array(
+    [""] + [" and %d cent%s" % (i, "" if i == 1 else "s") for i in range(1, 100)] +
+    [""] + [" and %s cent%s" % (literal_digits[i], "" if i == 1 else "s") for i in range(1, 10)],
+    dtype=object
+)
+
+# currency before the amount (index 1 + currency index, or 0 if none) and after it 
+# (the same index, or 1 + len(currencies) + currency index for the singular literal currencies)
+currencies_prefixes = np.array([""] + currencies_symbols, dtype=object)
+currencies_suffixes = np.array(
+    [""] + [" " + currency for currency in currencies_literals] + [" " + currency[:-1] for currency in currencies_literals],
+    dtype=object
+)
+
+def random_amounts_batch(num, rng=random):
+    """
+    Vectorized version of random_amount(): draw all the random choices of num amounts as numpy arrays,
+    and build the strings from the lookup tables. The amounts have the same distribution of random_amount().
+    args:
+    - rng: the source of randomness (the random module itself, or a random.Random instance), used
+      to seed the numpy generator
+    - output: a list of num amounts strings
+    """
+    np_rng = np.random.default_rng(rng.getrandbits(64))
+
+    whole_amounts = np_rng.integers(1, max_whole_amount + 1, num)
+    cents = np_rng.integers(0, 100, num)
+    currencies = np_rng.integers(0, len(currencies_symbols), num)
+    coins = np_rng.integers(0, 2, (4, num)).astype(bool)
 
-def generate_random_amounts(num):
-    amount_sentences = [random_amount() for _ in range(num)]
+    # half of the integer amounts between 1 and 9 are converted into literal digits with a literal currency
+    literal_whole_amounts = (whole_amounts < 10) & coins[0]
+    # the others have either numerical cents (e.g. 12.50) or literal ones (e.g. 12 and 50 cents)
+    numerical_cents = ~literal_whole_amounts & coins[1]
+    # ...and either a currency symbol or a literal currency
+    symbol_currencies = ~literal_whole_amounts & coins[2]
+    # half of the literal cents between 1 and 9 are converted into literal digits
+    literal_cents_digits = (cents < 10) & coins[3]
+
+    singular_currencies = literal_whole_amounts & (whole_amounts == 1)
+    currencies_suffixes_indices = np.where(symbol_currencies, 0, 1 + currencies + singular_currencies * len(currencies_literals))
+    cents_suffixes_indices = np.where(numerical_cents, 0, cents + literal_cents_digits * 100)
+
+    amounts = (
+        currencies_prefixes[np.where(symbol_currencies, 1 + currencies, 0)] +
+        np.where(literal_whole_amounts, literal_whole_amounts_strings[whole_amounts], whole_amounts_strings[whole_amounts]) +
+        np.where(numerical_cents, decimal_cents_strings[cents], "") +
+        currencies_suffixes[currencies_suffixes_indices] +
+        cents_suffixes[cents_suffixes_indices]
+    )
+
+    return amounts.tolist()
+
+def generate_random_amounts(num, rng=random):
+    amount_sentences = random_amounts_batch(num, rng)
     return amount_sentences
 
-# generate a sentence and the corresponding (labelled) tokens according to the BIO scheme
-def generate_random_amount_sentence_and_tokens(tokenizer):
-    template = "{amount}"
-    amount = random_amount()
+# endless stream of random amounts, generated in batches
+def generate_random_amounts_stream(rng=random, batch_size=BIO_BATCH_SIZE):
+    while True:
+        yield from random_amounts_batch(batch_size, rng)
 
-    sentence, tokens, tokens_labels = generate_BIO_tokens_from_template(
-        template,
-        tokenizer,
-        amount=(amount, AMOUNT_ENTITY_LABEL)
-    )
+# pick a random amount to substitute to the amount template
+def pick_random_amount_sample(rng=random):
+    amount = random_amount(rng)
+    return amount_template, dict(amount=(amount, AMOUNT_ENTITY_LABEL))
 
-    return sentence, tokens, tokens_labels
+# generate a sentence and the corresponding (labelled) tokens according to the BIO scheme
+def generate_random_amount_sentence_and_tokens(tokenizer):
+    template, entities = pick_random_amount_sample()
+    return template.render(tokenizer, **entities)
 
 # generate sentences + tokens + labels
-def generate_random_amount_intents_and_labelled_tokens(num_sentences, tokenizer):
+def generate_random_amount_intents_and_labelled_tokens(num_sentences, tokenizer, rng=random):
+    amounts = generate_random_amounts_stream(rng)
+
     return generate_grouped_intent_sentences_and_BIO_tokens(
         num_sentences,
         tokenizer,
         NONE_INTENT_LABEL,
-        generate_random_amount_sentence_and_tokens
+        lambda rng: (amount_template, dict(amount=(next(amounts), AMOUNT_ENTITY_LABEL))),
+        rng=rng
     )
 
 
@@ -0,0 +1,72 @@
+from utils.utils import INTENT_LABEL_NUM, ENTITY_LABEL_NUM
+
+# number of sentences written in each record batch
+ARROW_RECORD_BATCH_SIZE = 65536
+
+def import_pyarrow():
+    # pyarrow is only needed to export the datasets in the Arrow format
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("pyarrow is required to write and read the Arrow datasets (pip install pyarrow)") from e
+
+    return pyarrow
+
+def get_grouped_dataset_schema():
+    """
+    Schema of the Arrow dataset: one row per sentence, with its intent and its (labelled) tokens
+    """
+    pa = import_pyarrow()
+
+    return pa.schema([
+        ("sentence", pa.string()),
+        ("intent", pa.string()),
+        ("intent_label", pa.uint8()),
+        ("tokens", pa.list_(pa.string())),
+        ("tokens_labels", pa.list_(pa.uint8()))
+    ])
+
+def write_grouped_intent_and_tokens_arrow(grouped_elements, arrow_filepath, batch_size=ARROW_RECORD_BATCH_SIZE):
+    """
+    Write the grouped elements to an Arrow IPC file (memory-mappable), one row per sentence, consuming
+    them one record batch at a time (grouped_elements can be any iterable, e.g. a generator).
+    Intents and BIO labels are stored as their numbers (see INTENT_LABEL_NUM and ENTITY_LABEL_NUM).
+    - output: the number of written sentences
+    """
+    pa = import_pyarrow()
+    schema = get_grouped_dataset_schema()
+    num_sentences = 0
+
+    columns = {name: [] for name in schema.names}
+
+    def write_batch(writer):
+        writer.write_batch(pa.record_batch([pa.array(columns[name], type=schema.field(name).type) for name in schema.names], schema=schema))
+        for values in columns.values():
+            values.clear()
+
+    with pa.OSFile(arrow_filepath, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for sentence, intent_label, sentence_tokens, sentence_tokens_labels in grouped_elements:
+            columns["sentence"].append(sentence)
+            columns["intent"].append(intent_label)
+            columns["intent_label"].append(INTENT_LABEL_NUM[intent_label])
+            columns["tokens"].append(sentence_tokens)
+            columns["tokens_labels"].append([ENTITY_LABEL_NUM[label] for label in sentence_tokens_labels])
+            num_sentences += 1
+
+            if len(columns["sentence"]) >= batch_size:
+                write_batch(writer)
+
+        if len(columns["sentence"]) > 0:
+            write_batch(writer)
+
+    return num_sentences
+
+def read_grouped_intent_and_tokens_arrow(arrow_filepath):
+    """
+    Memory-map an Arrow dataset written by write_grouped_intent_and_tokens_arrow()
+    - output: a pyarrow Table (its columns are not copied in memory)
+    """
+    pa = import_pyarrow()
+
+    with pa.memory_map(arrow_filepath, "r") as source:
+        return pa.ipc.open_file(source).read_all()
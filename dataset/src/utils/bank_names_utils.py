@@ -1,5 +1,5 @@
 import random
-from utils.utils import generate_BIO_tokens_from_template, BANK_ENTITY_LABEL, \
+from utils.utils import CompiledTemplate, BANK_ENTITY_LABEL, register_entity_pool, \
     generate_grouped_intent_sentences_and_BIO_tokens, NONE_INTENT_LABEL
 
 # bank names with actual bank names, fictional names and primary/default
@@ -28,6 +28,12 @@ bank_names = [
     "Sberbank", "VTB Bank", "Gazprombank", "Alfa Bank", "Rossiya Bank"
 ]
 
+# bank names are tokenized just once
+register_entity_pool(BANK_ENTITY_LABEL, bank_names)
+
+bank_template = CompiledTemplate("{bank}")
+bank_account_template = CompiledTemplate("{bank} account")
+
 def generate_bank_accounts_dataset(num_sentences):
     sentences = []
 
@@ -42,27 +48,27 @@ def generate_bank_accounts_dataset(num_sentences):
 
     return sentences
 
-def generate_bank_accounts_sentence_and_tokens(tokenizer):
-    template = "{bank}"
+# pick a random bank, and the template to substitute it to
+def pick_bank_accounts_sample(rng=random):
+    template = bank_template
 
-     # add 'account' 1/3 of the times
-    if random.choice([True, False, False]):
-        template += " account"
+    # add 'account' 1/3 of the times
+    if rng.choice([True, False, False]):
+        template = bank_account_template
 
-    bank = random.choice(bank_names)
+    bank = rng.choice(bank_names)
 
-    sentence, tokens, tokens_labels = generate_BIO_tokens_from_template(
-        template,
-        tokenizer,
-        bank=(bank, BANK_ENTITY_LABEL)
-    )
+    return template, dict(bank=(bank, BANK_ENTITY_LABEL))
 
-    return sentence, tokens, tokens_labels
+def generate_bank_accounts_sentence_and_tokens(tokenizer):
+    template, entities = pick_bank_accounts_sample()
+    return template.render(tokenizer, **entities)
 
-def generate_bank_accounts_intents_and_labelled_tokens(num_sentences, tokenizer):
+def generate_bank_accounts_intents_and_labelled_tokens(num_sentences, tokenizer, rng=random):
     return generate_grouped_intent_sentences_and_BIO_tokens(
         num_sentences,
         tokenizer,
         NONE_INTENT_LABEL,
-        generate_bank_accounts_sentence_and_tokens
-    )
+        pick_bank_accounts_sample,
+        rng=rng
+    )
\ No newline at end of file
@@ -0,0 +1,142 @@
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+# each round of a benchmark calls it in a loop for at least this time (in seconds)
+BENCHMARK_MIN_TIME = 0.2
+BENCHMARK_ROUNDS = 5
+# relative drop of samples/sec or bytes/sec reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+# name -> function registered with @benchmark
+benchmarks = {}
+
+def benchmark(name):
+    """
+    Register a benchmark: the decorated function is called once (outside of the timing) with the setup
+    arguments (e.g. the tokenizer), and returns a function running the measured code once
+    - output of the run function: a (num_samples, num_bytes) pair, i.e. the processed samples and bytes
+      (num_bytes is None if it does not make sense for the benchmark)
+    """
+    def register(setup_function):
+        if name in benchmarks:
+            raise ValueError("benchmark '%s' registered twice" % name)
+
+        benchmarks[name] = setup_function
+        return setup_function
+
+    return register
+
+def time_benchmark(run, rounds=BENCHMARK_ROUNDS, min_time=BENCHMARK_MIN_TIME, seed=0):
+    """
+    Time a run function (as returned by a benchmark setup), as timeit does: the number of loops per round is
+    doubled until a round lasts at least min_time, then the best and the median time of rounds rounds are taken.
+    The global random generator is seeded before each round, so that all rounds do the same work
+    - output: a dict with the timings (in seconds per run) and the throughputs (computed on the median time)
+    """
+    def time_loops(loops):
+        random.seed(seed)
+        start = time.perf_counter()
+        for _ in range(loops):
+            result = run()
+        return time.perf_counter() - start, result
+
+    # (calibration, which also warms up the caches)
+    loops = 1
+    while True:
+        elapsed, (num_samples, num_bytes) = time_loops(loops)
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    times = [time_loops(loops)[0] / loops for _ in range(rounds)]
+    median = statistics.median(times)
+
+    return {
+        "loops": loops,
+        "times": times,
+        "best": min(times),
+        "median": median,
+        "samples": num_samples,
+        "bytes": num_bytes,
+        "samples_per_sec": num_samples / median,
+        "bytes_per_sec": None if num_bytes is None else num_bytes / median
+    }
+
+def git_commit():
+    # commit of the measured sources (None outside of a git repository)
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(names, setup_args=(), rounds=BENCHMARK_ROUNDS, min_time=BENCHMARK_MIN_TIME, log=print):
+    """
+    Set up and time the registered benchmarks with the given names
+    - output: the results report (as a dict), with the environment the benchmarks ran in
+    """
+    results = {}
+
+    for name in names:
+        random.seed(0)
+        run = benchmarks[name](*setup_args)
+        results[name] = time_benchmark(run, rounds, min_time)
+
+        if log is not None:
+            log(format_result(name, results[name]))
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "rounds": rounds,
+        "min_time": min_time,
+        "benchmarks": results
+    }
+
+def format_result(name, result):
+    line = "%-45s %10.1f samples/s" % (name, result["samples_per_sec"])
+    if result["bytes_per_sec"] is not None:
+        line += " %10.1f KB/s" % (result["bytes_per_sec"] / 1024)
+    return line + "   (median %.3f ms, best %.3f ms)" % (result["median"] * 1000, result["best"] * 1000)
+
+def save_results(report, json_filepath):
+    os.makedirs(os.path.dirname(json_filepath) or ".", exist_ok=True)
+
+    with open(json_filepath, "w") as file:
+        json.dump(report, file, indent=4)
+
+def load_results(json_filepath):
+    with open(json_filepath, "r") as file:
+        return json.load(file)
+
+def compare_results(baseline, report, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare the throughputs of two results reports (only the benchmarks found in both)
+    - output: a list of (name, metric, baseline value, new value, relative change) of the regressions,
+      i.e. the samples/sec or bytes/sec which dropped by more than threshold
+    """
+    regressions = []
+
+    for name, result in report["benchmarks"].items():
+        baseline_result = baseline["benchmarks"].get(name)
+        if baseline_result is None:
+            continue
+
+        for metric in ["samples_per_sec", "bytes_per_sec"]:
+            old_value, new_value = baseline_result.get(metric), result.get(metric)
+            if not old_value or new_value is None:
+                continue
+
+            change = new_value / old_value - 1
+            if change < -threshold:
+                regressions.append((name, metric, old_value, new_value, change))
+
+    return regressions
@@ -0,0 +1,136 @@
+import ast
+import glob
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import pickle
+import sys
+
+# directory of the dataset generator sources: only the modules inside it are fingerprinted
+SOURCES_DIRPATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def imported_modules(module):
+    """
+    Modules a module imports from (with import or from ... import statements), found by parsing its source:
+    unlike its global objects, they include the modules of the imported data (e.g. the lists of bank names)
+    """
+    with open(module.__file__, "rb") as file:
+        tree = ast.parse(file.read())
+
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            package = module.__package__ if node.level > 0 else None
+            names.append(importlib.util.resolve_name("." * node.level + (node.module or ""), package))
+
+    return [sys.modules[name] for name in names if name in sys.modules]
+
+def module_dependencies(module, dependencies=None):
+    """
+    Collect a module and (transitively) the modules of the generator it depends on, i.e. the modules
+    it imports from and the modules of its global objects (functions, classes, ...) defined in SOURCES_DIRPATH
+    - output: a dict module name -> module
+    """
+    if dependencies is None:
+        dependencies = {}
+
+    dependencies[module.__name__] = module
+
+    candidates = imported_modules(module)
+    for value in list(vars(module).values()):
+        candidates.append(value if inspect.ismodule(value) else sys.modules.get(getattr(value, "__module__", None) or ""))
+
+    for dependency in candidates:
+        if dependency is None or dependency.__name__ in dependencies:
+            continue
+
+        filepath = getattr(dependency, "__file__", None)
+        if filepath is not None and os.path.abspath(filepath).startswith(SOURCES_DIRPATH + os.sep):
+            module_dependencies(dependency, dependencies)
+
+    return dependencies
+
+def sources_fingerprint(function):
+    """
+    Hash the source files of the module defining a function and of all the generator modules it depends on:
+    templates, entity pools and generation code are all defined in them
+    """
+    modules = module_dependencies(sys.modules[function.__module__])
+    sha256 = hashlib.sha256()
+
+    for name in sorted(modules):
+        sha256.update(name.encode("utf-8"))
+        with open(modules[name].__file__, "rb") as file:
+            sha256.update(hashlib.sha256(file.read()).digest())
+
+    return sha256.hexdigest()
+
+def tokenizer_fingerprint(tokenizer):
+    """
+    Hash the vocab of a tokenizer (and its lowercasing), which determines the tokens
+    """
+    vocab = tokenizer.vocab if isinstance(getattr(tokenizer, "vocab", None), dict) else tokenizer.get_vocab()
+    do_lower_case = getattr(tokenizer, "do_lower_case", None)
+    return hashlib.sha256(json.dumps([sorted(vocab.items()), do_lower_case]).encode("utf-8")).hexdigest()
+
+def intent_inputs_hash(generation_function, num_sentences, seed, num_shards, **parameters):
+    """
+    Content address of the dataset of an intent: a hash of everything its sentences depend on, i.e. the
+    generation code (with templates and entity pools), the seed, the number of sentences and of shards,
+    plus any other parameter (e.g. the tokenizer fingerprint, or the size and seed of the names pool)
+    """
+    inputs = dict(parameters, sources=sources_fingerprint(generation_function), function=generation_function.__name__,
+                  num_sentences=num_sentences, seed=seed, num_shards=num_shards)
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+class ShardCache:
+    """
+    Directory of the generated shards (pickled CompactSamples), addressed by the hash of their inputs,
+    so that only the intents whose inputs changed are generated again
+    """
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+        os.makedirs(dirpath, exist_ok=True)
+
+    def shard_filepath(self, name, key, index):
+        return os.path.join(self.dirpath, "%s-%s-%05d.pickle" % (name, key, index))
+
+    def load(self, name, key, index):
+        """
+        - output: the cached CompactSamples of the shard (without tokenizer), or None if it is not cached
+        """
+        filepath = self.shard_filepath(name, key, index)
+
+        if not os.path.exists(filepath):
+            return None
+
+        with open(filepath, "rb") as file:
+            return pickle.load(file)
+
+    def save(self, name, key, index, samples):
+        filepath = self.shard_filepath(name, key, index)
+
+        # write to a temporary file first, so that an interrupted run does not leave a broken shard
+        with open(filepath + ".tmp", "wb") as file:
+            pickle.dump(samples, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(filepath + ".tmp", filepath)
+
+    def prune(self, name, key):
+        """
+        Remove the cached shards of a dataset having a different key (i.e. generated from older inputs)
+        - output: the number of removed shards
+        """
+        removed = 0
+
+        for filepath in glob.glob(os.path.join(self.dirpath, glob.escape(name) + "-*.pickle")):
+            if not os.path.basename(filepath).startswith("%s-%s-" % (name, key)):
+                os.remove(filepath)
+                removed += 1
+
+        return removed
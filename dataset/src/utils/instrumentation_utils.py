@@ -0,0 +1,270 @@
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# minimum interval between two updates of the progress line (in seconds)
+PROGRESS_INTERVAL = 0.5
+
+def peak_rss_mb(who="self"):
+    """
+    Peak resident set size of the current process (or of its terminated children, e.g. the
+    worker processes), in MB, or None where the resource module is not available
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # (ru_maxrss is in bytes on macOS, in KB elsewhere)
+    return usage.ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+
+class CountingTokenizer:
+    """
+    Wrapper of a tokenizer counting its tokenization calls (and the tokenized texts), attributing them to
+    the instrumentation stage being run. Any other attribute is the one of the wrapped tokenizer.
+    """
+
+    def __init__(self, tokenizer, instrumentation):
+        self.tokenizer = tokenizer
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        return getattr(self.tokenizer, name)
+
+    def __len__(self):
+        return len(self.tokenizer)
+
+    def __reduce_ex__(self, protocol):
+        # pickled as the wrapped tokenizer (e.g. when sent to the worker processes, whose calls are not counted)
+        return self.tokenizer.__reduce_ex__(protocol)
+
+    def __call__(self, text, *args, **kwargs):
+        self.instrumentation.count_tokenizer_call(1 if isinstance(text, str) else len(text))
+        return self.tokenizer(text, *args, **kwargs)
+
+    def tokenize(self, text, *args, **kwargs):
+        self.instrumentation.count_tokenizer_call(1)
+        return self.tokenizer.tokenize(text, *args, **kwargs)
+
+class RunInstrumentation:
+    """
+    Opt-in instrumentation of a generation run: the wall time, the processed samples, the tokenizer calls and
+    the peak memory of each stage. Stages are either blocks of code (see stage()) or streams of samples (see
+    instrument_stream()): as the datasets are generated lazily, the stages of the pipeline run interleaved, and the
+    time spent in each of them is measured every time it is resumed. The self time of a stage excludes the time
+    spent in the stages it pulled its samples from (e.g. the writing excludes the generation of the intents).
+    When disabled, all its methods leave the code and the streams unchanged.
+    args:
+    - enabled: False to disable the instrumentation
+    - progress: print a progress line (with the ETA of each stream with a known total) on the stream progress_file
+    - trace_memory: trace the peak memory allocated by Python during the (block) stages, with tracemalloc (slow)
+    """
+
+    def __init__(self, enabled=True, progress=True, trace_memory=False, progress_file=sys.stderr):
+        self.enabled = enabled
+        self.progress = progress and enabled
+        self.trace_memory = trace_memory and enabled
+        self.progress_file = progress_file
+
+        self.stages = {}
+        self.active_stages = []
+        self.tokenizer_calls = 0
+        self.tokenized_texts = 0
+        self.start_time = time.perf_counter()
+        self.last_progress_time = self.start_time
+        self.progress_printed = False
+
+        if self.trace_memory:
+            tracemalloc.start()
+
+    def get_stage(self, name, total=None):
+        if name not in self.stages:
+            self.stages[name] = {
+                "wall_time": 0.0,
+                "child_time": 0.0,
+                "samples": 0,
+                "total": total,
+                "tokenizer_calls": 0,
+                "tokenized_texts": 0,
+                "first_start_time": None,
+                "entered_time": None
+            }
+        return self.stages[name]
+
+    def enter(self, stage):
+        stage["entered_time"] = time.perf_counter()
+        if stage["first_start_time"] is None:
+            stage["first_start_time"] = stage["entered_time"]
+        self.active_stages.append(stage)
+
+    def exit(self, stage):
+        elapsed_time = time.perf_counter() - stage["entered_time"]
+        self.active_stages.pop()
+        stage["wall_time"] += elapsed_time
+
+        if len(self.active_stages) > 0:
+            self.active_stages[-1]["child_time"] += elapsed_time
+
+    def update_traced_peak(self):
+        # fold the peak traced so far into the active stages, then measure a new peak from now on
+        peak = tracemalloc.get_traced_memory()[1]
+        for stage in self.active_stages:
+            stage["peak_traced"] = max(stage.get("peak_traced", 0), peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name, num_samples=None):
+        """
+        Measure a block of code, which processes num_samples samples (if known)
+        """
+        if not self.enabled:
+            yield
+            return
+
+        stage = self.get_stage(name)
+
+        if self.trace_memory:
+            self.update_traced_peak()
+
+        self.enter(stage)
+        try:
+            yield
+        finally:
+            if self.trace_memory:
+                self.update_traced_peak()
+
+            self.exit(stage)
+            stage["samples"] += num_samples or 0
+            stage["peak_rss_mb"] = peak_rss_mb()
+
+    def instrument_stream(self, name, elements, total=None, timed=True):
+        """
+        Measure the production of the elements of a stream (i.e. the time spent to get each of them)
+        - total: the expected number of elements, to show the progress of the stream
+        - timed: False to only count the elements in the stage (e.g. the input of a block stage, timed by stage())
+        - output: a generator of the same elements
+        """
+        if not self.enabled:
+            return elements
+
+        return self.instrumented_stream(self.get_stage(name, total), elements, timed)
+
+    def instrumented_stream(self, stage, elements, timed=True):
+        iterator = iter(elements)
+
+        while True:
+            if timed:
+                if self.trace_memory:
+                    self.update_traced_peak()
+                self.enter(stage)
+            try:
+                element = next(iterator)
+            except StopIteration:
+                # (the peak memory of the process, once the stream is exhausted)
+                stage["peak_rss_mb"] = peak_rss_mb()
+                return
+            finally:
+                if timed:
+                    if self.trace_memory:
+                        # (the memory allocated while getting the element is attributed to the stream)
+                        self.update_traced_peak()
+                    self.exit(stage)
+
+            stage["samples"] += 1
+
+            if stage["total"] is not None and stage["samples"] == stage["total"]:
+                # (the consumer may stop after the expected elements, without exhausting the stream)
+                stage["peak_rss_mb"] = peak_rss_mb()
+
+            if self.progress and stage["total"] is not None:
+                self.print_progress()
+
+            yield element
+
+    def wrap_tokenizer(self, tokenizer):
+        return CountingTokenizer(tokenizer, self) if self.enabled else tokenizer
+
+    def count_tokenizer_call(self, num_texts):
+        self.tokenizer_calls += 1
+        self.tokenized_texts += num_texts
+
+        if len(self.active_stages) > 0:
+            self.active_stages[-1]["tokenizer_calls"] += 1
+            self.active_stages[-1]["tokenized_texts"] += num_texts
+
+    def print_progress(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self.last_progress_time < PROGRESS_INTERVAL:
+            return
+
+        self.last_progress_time = now
+        items = []
+
+        for name, stage in self.stages.items():
+            if stage["total"] is None or stage["first_start_time"] is None:
+                continue
+
+            done, total = stage["samples"], stage["total"]
+            if done >= total:
+                items.append("%s done" % name)
+                continue
+
+            # (the streams are consumed together: the ETA is based on the rate of each of them since its start)
+            eta = (total - done) * (now - stage["first_start_time"]) / done if done > 0 else None
+            items.append("%s %d%% ETA %s" % (name, 100 * done // max(total, 1), "?" if eta is None else "%ds" % eta))
+
+        self.progress_file.write("\r\033[K[%ds] %s" % (now - self.start_time, " | ".join(items)))
+        self.progress_file.flush()
+        self.progress_printed = True
+
+    def report(self, **run_info):
+        """
+        - output: the run report (as a dict), including the given run information (e.g. the arguments of the run)
+        """
+        total_time = time.perf_counter() - self.start_time
+        stages = {}
+
+        for name, stage in self.stages.items():
+            stages[name] = {
+                "wall_time": stage["wall_time"],
+                "self_time": stage["wall_time"] - stage["child_time"],
+                "samples": stage["samples"],
+                "samples_per_sec": stage["samples"] / stage["wall_time"] if stage["samples"] > 0 else None,
+                "tokenizer_calls": stage["tokenizer_calls"],
+                "tokenized_texts": stage["tokenized_texts"]
+            }
+
+            if "peak_rss_mb" in stage:
+                stages[name]["peak_rss_mb"] = stage["peak_rss_mb"]
+            if "peak_traced" in stage:
+                stages[name]["peak_traced_mb"] = stage["peak_traced"] / 2**20
+
+        report = dict(run_info)
+        report.update({
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "total_time": total_time,
+            "tokenizer_calls": self.tokenizer_calls,
+            "tokenized_texts": self.tokenized_texts,
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_children_rss_mb": peak_rss_mb("children"),
+            "stages": stages
+        })
+
+        if self.trace_memory:
+            report["peak_traced_mb"] = max([tracemalloc.get_traced_memory()[1]] + [stage.get("peak_traced", 0)
+                                                                                   for stage in self.stages.values()]) / 2**20
+        return report
+
+    def save_report(self, json_filepath, **run_info):
+        if self.progress_printed:
+            self.print_progress(force=True)
+            self.progress_file.write("\n")
+
+        os.makedirs(os.path.dirname(json_filepath) or ".", exist_ok=True)
+
+        with open(json_filepath, "w") as file:
+            json.dump(self.report(**run_info), file, indent=4)
@@ -1,5 +1,7 @@
 import random
-from utils.utils import USER_ENTITY_LABEL, NONE_INTENT_LABEL
+import numpy as np
+from utils.utils import tokenize_batch, generate_BIO_labels, register_entity_pool, get_entity_pools, \
+    tokenized_entity_pools, BIO_BATCH_SIZE, USER_ENTITY_LABEL, NONE_INTENT_LABEL
 
 # 100 male and 100 female English names
 english_first_names = [
@@ -127,27 +129,27 @@ common_english_names = [
     "scientist", "teacher", "photographer", "designer", "architect",
 ]
 
-def pick_names(**kwargs):
+def pick_names(rng=random, **kwargs):
     all_selected_names = []
 
     if 'english_first_names' in kwargs:
         num_english_first_names = kwargs['english_first_names']
-        all_selected_names += random.sample(english_first_names, num_english_first_names)
+        all_selected_names += rng.sample(english_first_names, num_english_first_names)
     
     if 'english_full_names' in kwargs:
         num_english_full_names = kwargs['english_full_names']
-        selected_first_names = random.sample(english_first_names, num_english_full_names)
-        selected_surnames = random.sample(english_surnames, num_english_full_names)
+        selected_first_names = rng.sample(english_first_names, num_english_full_names)
+        selected_surnames = rng.sample(english_surnames, num_english_full_names)
         all_selected_names += list(map(lambda first_name, surname: "%s %s" % (first_name, surname), selected_first_names, selected_surnames))
 
     if 'italian_first_names' in kwargs:
         num_italian_first_names = kwargs['italian_first_names']
-        all_selected_names += random.sample(italian_first_names, num_italian_first_names)
+        all_selected_names += rng.sample(italian_first_names, num_italian_first_names)
 
     if 'italian_full_names' in kwargs:
         num_italian_full_names = kwargs['italian_full_names']
-        selected_first_names = random.sample(italian_first_names, num_italian_full_names)
-        selected_surnames = random.sample(italian_surnames, num_italian_full_names)
+        selected_first_names = rng.sample(italian_first_names, num_italian_full_names)
+        selected_surnames = rng.sample(italian_surnames, num_italian_full_names)
         all_selected_names += list(map(lambda first_name, surname: "%s %s" % (first_name, surname), selected_first_names, selected_surnames))
 
     if 'common_names' in kwargs:
@@ -156,23 +158,24 @@ def pick_names(**kwargs):
         selected_common_names = []
 
         while len(selected_common_names) < num_common_names:
-            common_name = random.choice(all_common_names)
+            common_name = rng.choice(all_common_names)
             selected_common_names.append(
                 common_name 
-                if random.choice([True, False]) 
-                else common_name + " " + random.choice(
+                if rng.choice([True, False]) 
+                else common_name + " " + rng.choice(
                     english_first_names 
-                    if random.choice([True, False]) 
+                    if rng.choice([True, False]) 
                     else italian_first_names
                 )
             )
         
         all_selected_names += selected_common_names
 
-    random.shuffle(all_selected_names)
+    rng.shuffle(all_selected_names)
     return all_selected_names
 
-names = pick_names(
+# share of each type of names in the pool used by the intents generators
+names_pool_weights = dict(
     english_first_names=100,
     english_full_names=100,
     italian_first_names=100,
@@ -180,7 +183,106 @@ names = pick_names(
     common_names=50
 )
 
-def generate_random_names(**kwargs):
+# maximum number of names of each type that pick_names() can pick
+max_names_counts = dict(
+    english_first_names=len(english_first_names),
+    english_full_names=min(len(english_first_names), len(english_surnames)),
+    italian_first_names=len(italian_first_names),
+    italian_full_names=min(len(italian_first_names), len(italian_surnames))
+)
+
+class NamePool:
+    """
+    Pool of names picked with pick_names(), used as users by the intents generators. The names are
+    picked lazily (the first time the pool is used) with their own seeded random stream, so the pool
+    is reproducible and does not depend on the global random state.
+    args:
+    - size: total number of names, split among the names types according to names_pool_weights
+    - seed: seed of the names picking
+    """
+
+    def __init__(self, size=450, seed=0):
+        self.size = size
+        self.seed = seed
+        self._names = None
+
+    def __repr__(self):
+        return "NamePool(size=%d, seed=%r)" % (self.size, self.seed)
+
+    def configure(self, size=None, seed=None):
+        """
+        Change the size and/or the seed of the pool: the names are picked again when the pool is next used
+        """
+        if size is not None:
+            self.size = size
+        if seed is not None:
+            self.seed = seed
+
+        # (check the size before the names are actually picked)
+        self.names_counts()
+        self._names = None
+        # the tokenized pools contain the previous names
+        tokenized_entity_pools.clear()
+
+    def names_counts(self):
+        """
+        Split the size of the pool among the names types, proportionally to their weights (largest remainder method)
+        """
+        total_weight = sum(names_pool_weights.values())
+        quotas = {names_type: self.size * weight / total_weight for names_type, weight in names_pool_weights.items()}
+        counts = {names_type: int(quota) for names_type, quota in quotas.items()}
+
+        by_remainder = sorted(quotas, key=lambda names_type: quotas[names_type] - counts[names_type], reverse=True)
+        for names_type in by_remainder[:self.size - sum(counts.values())]:
+            counts[names_type] += 1
+
+        # pick_names() picks the first names and the surnames without replacement
+        for names_type, max_count in max_names_counts.items():
+            if counts[names_type] > max_count:
+                raise ValueError("A pool of %d names needs %d %s, but at most %d can be picked" % 
+                                 (self.size, counts[names_type], names_type, max_count))
+
+        return counts
+
+    @property
+    def names(self):
+        if self._names is None:
+            self._names = pick_names(random.Random(self.seed), **self.names_counts())
+        return self._names
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        return self.names[i]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def choice(self, rng=random):
+        return rng.choice(self.names)
+
+    def sample(self, n, rng=random):
+        """
+        Pick n names (with replacement) at once, drawing their indices with numpy
+        args:
+        - rng: the source of randomness (the random module itself, or a random.Random instance), used
+          to seed the numpy generator
+        """
+        np_rng = np.random.default_rng(rng.getrandbits(64))
+        names = self.names
+        return [names[i] for i in np_rng.integers(0, len(names), n).tolist()]
+
+# names used as users by the intents generators
+user_names_pool = NamePool()
+
+# the picked names are tokenized just once (the pool is iterated only when the entity pools are first used)
+register_entity_pool(USER_ENTITY_LABEL, user_names_pool)
+
+def generate_random_names(rng=random, **kwargs):
     all_selected_names = []
 
     if 'english_first_names' in kwargs:
@@ -188,7 +290,7 @@ def generate_random_names(**kwargs):
         selected_english_first_names = []
 
         while len(selected_english_first_names) < num_english_first_names:
-            selected_english_first_names.append(random.choice(english_first_names))
+            selected_english_first_names.append(rng.choice(english_first_names))
         
         all_selected_names += selected_english_first_names
     
@@ -197,8 +299,8 @@ def generate_random_names(**kwargs):
         selected_english_full_names = []
 
         while len(selected_english_full_names) < num_english_full_names:
-            first_name = random.choice(english_first_names)
-            last_name = random.choice(english_surnames)
+            first_name = rng.choice(english_first_names)
+            last_name = rng.choice(english_surnames)
             selected_english_full_names.append("%s %s" % (first_name, last_name))
 
         all_selected_names += selected_english_full_names
@@ -208,7 +310,7 @@ def generate_random_names(**kwargs):
         selected_italian_first_names = []
 
         while len(selected_italian_first_names) < num_italian_first_names:
-            selected_italian_first_names.append(random.choice(italian_first_names))
+            selected_italian_first_names.append(rng.choice(italian_first_names))
 
         all_selected_names += selected_italian_first_names
 
@@ -217,8 +319,8 @@ def generate_random_names(**kwargs):
         selected_italian_full_names = []
 
         while len(selected_italian_full_names) < num_italian_full_names:
-            first_name = random.choice(italian_first_names)
-            last_name = random.choice(italian_surnames)
+            first_name = rng.choice(italian_first_names)
+            last_name = rng.choice(italian_surnames)
             selected_italian_full_names.append("%s %s" % (first_name, last_name))
 
         all_selected_names += selected_italian_full_names
@@ -229,40 +331,60 @@ def generate_random_names(**kwargs):
         selected_common_names = []
 
         while len(selected_common_names) < num_common_names:
-            common_name = random.choice(all_common_names)
+            common_name = rng.choice(all_common_names)
             selected_common_names.append(
                 common_name 
-                if random.choice([True, False]) 
-                else common_name + " " + random.choice(
+                if rng.choice([True, False]) 
+                else common_name + " " + rng.choice(
                     english_first_names 
-                    if random.choice([True, False]) 
+                    if rng.choice([True, False]) 
                     else italian_first_names
                 )
             )
         
         all_selected_names += selected_common_names
 
-    random.shuffle(all_selected_names)
+    rng.shuffle(all_selected_names)
     return all_selected_names
 
-def generate_random_names_intents_and_labelled_tokens(num_sentences, tokenizer):
-    num_names_per_type = num_sentences // 5
+# the types of names generated by generate_random_names()
+NAMES_TYPES = ["english_first_names", "english_full_names", "italian_first_names", "italian_full_names", "common_names"]
+
+def generate_random_names_intents_and_labelled_tokens(num_sentences, tokenizer, rng=random):
+    """
+    Lazily generate (and tokenize) random names, one batch at a time: exactly num_sentences names,
+    the same number of each type (but for the remainder, one more name of the first types)
+    """
+    names_pool = get_entity_pools(tokenizer)[USER_ENTITY_LABEL]
+    num_names_per_type, num_remaining_names = divmod(num_sentences, len(NAMES_TYPES))
+
+    def names_batches_sizes():
+        generated_names_per_type = 0
+
+        while generated_names_per_type < num_names_per_type:
+            # the same number of names of each type is generated in each batch (and shuffled within it)
+            batch_names_per_type = min(BIO_BATCH_SIZE // len(NAMES_TYPES), num_names_per_type - generated_names_per_type)
+            yield {names_type: batch_names_per_type for names_type in NAMES_TYPES}
+            generated_names_per_type += batch_names_per_type
+
+        if num_remaining_names > 0:
+            yield {names_type: 1 for names_type in NAMES_TYPES[:num_remaining_names]}
 
-    names = generate_random_names(
-        english_first_names=num_names_per_type,
-        english_full_names=num_names_per_type,
-        italian_first_names=num_names_per_type,
-        italian_full_names=num_names_per_type,
-        common_names=num_names_per_type
-    )
+    for batch_sizes in names_batches_sizes():
+        names_batch = generate_random_names(rng, **batch_sizes)
 
-    grouped_elements = []
+        # tokenize the names with one tokenizer call per batch (names already in the pool are not tokenized again)
+        new_names = [name for name in names_batch if name not in names_pool]
+        new_names_tokens = dict(zip(new_names, tokenize_batch(tokenizer, new_names)))
 
-    for name in names:
-        name_tokens = tokenizer.tokenize(name)
-        name_tokens_labels = ["B-%s" % USER_ENTITY_LABEL] + ["I-%s" % USER_ENTITY_LABEL] * (len(name_tokens) - 1)
-        elements = (name, NONE_INTENT_LABEL, name_tokens, name_tokens_labels)
-        grouped_elements.append(elements)
+        for name in names_batch:
+            pooled_name = names_pool.lookup(name)
 
-    return grouped_elements
+            if pooled_name is not None:
+                # (copies, not to share the pool lists)
+                name_tokens, name_tokens_labels = list(pooled_name[0]), list(pooled_name[1])
+            else:
+                name_tokens = new_names_tokens[name]
+                name_tokens_labels = generate_BIO_labels(USER_ENTITY_LABEL, len(name_tokens))
 
+            yield (name, NONE_INTENT_LABEL, name_tokens, name_tokens_labels)
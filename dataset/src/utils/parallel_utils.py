@@ -0,0 +1,119 @@
+import hashlib
+import random
+from collections import deque
+import utils.names_utils as names_utils
+from utils.samples_utils import CompactSamples
+
+# tokenizer used by the generation functions running in the current worker process (see init_worker())
+worker_tokenizer = None
+
+def shard_sizes(num_sentences, num_shards):
+    """
+    Split a number of sentences in (at most) num_shards shards of (almost) the same size
+    """
+    num_shards = max(1, min(num_shards, num_sentences))
+    base_size, remainder = divmod(num_sentences, num_shards)
+    return [base_size + (1 if i < remainder else 0) for i in range(num_shards)]
+
+def shard_seed(seed, name, index):
+    """
+    Derive the seed of a shard from the global seed, the name of the dataset and the shard index:
+    the shards' random streams are independent of each other and of the number of worker processes
+    """
+    digest = hashlib.sha256(("%s:%s:%d" % (seed, name, index)).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+def init_worker(tokenizer, names_pool):
+    """
+    Initializer of the worker processes: set the tokenizer and use the same names pool (size and seed) of the main process
+    """
+    global worker_tokenizer
+    worker_tokenizer = tokenizer
+
+    names_utils.user_names_pool.configure(size=names_pool.size, seed=names_pool.seed)
+
+def generate_shard(generation_function, num_sentences, seed):
+    """
+    Generate a whole shard in a worker process (the elements are sent back to the main process all together,
+    as CompactSamples, which are much smaller both to be pickled and to be kept in memory while waiting)
+    """
+    return CompactSamples(worker_tokenizer, generation_function(num_sentences, worker_tokenizer, random.Random(seed)))
+
+def generate_intent_shards(generation_function, num_sentences, tokenizer, name, seed, num_shards=1, executor=None, prefetch=2,
+                           cache=None, cache_key=None):
+    """
+    Lazily generate the sentences of an intent dataset, split in shards with their own deterministic random stream:
+    the output only depends on the seed and the number of shards, not on the number of worker processes.
+    args:
+    - generation_function: a generate_*_intents_and_labelled_tokens(num_sentences, tokenizer, rng) function
+      (defined at the module level, to be sent to the worker processes)
+    - name: the name of the dataset, used to derive the seeds of its shards
+    - executor: a concurrent.futures.ProcessPoolExecutor whose workers are initialized with init_worker(),
+      or None to generate the shards lazily in the current process
+    - prefetch: number of shards being generated in advance by the worker processes (bounding the memory)
+    - cache: a ShardCache where the shards are saved once generated, and loaded from if already generated
+      with the same inputs, identified by cache_key (see intent_inputs_hash())
+    """
+    sizes = shard_sizes(num_sentences, num_shards)
+    seeds = [shard_seed(seed, name, i) for i in range(len(sizes))]
+
+    def load_cached_shard(i):
+        shard = cache.load(name, cache_key, i) if cache is not None else None
+
+        if shard is not None:
+            # (the tokenizer is not pickled with the samples)
+            shard.tokenizer = tokenizer
+
+        return shard
+
+    if executor is None:
+        for i, (size, current_seed) in enumerate(zip(sizes, seeds)):
+            shard = load_cached_shard(i)
+
+            if shard is not None:
+                yield from shard
+                continue
+
+            if cache is None:
+                yield from generation_function(size, tokenizer, random.Random(current_seed))
+                continue
+
+            # keep the generated samples, to save them once the shard is complete (before yielding
+            # its last element: the consumer may not resume this generator after that)
+            shard = CompactSamples(tokenizer)
+            for element in generation_function(size, tokenizer, random.Random(current_seed)):
+                shard.append(element)
+
+                if len(shard) == size:
+                    cache.save(name, cache_key, i, shard)
+
+                yield element
+
+            if len(shard) != size:
+                # (a generation function returning a different number of samples)
+                cache.save(name, cache_key, i, shard)
+        return
+
+    pending = deque()
+    next_shard = 0
+
+    while next_shard < len(sizes) or len(pending) > 0:
+        while next_shard < len(sizes) and len(pending) < prefetch:
+            # the shards already generated are just loaded from the cache
+            shard = load_cached_shard(next_shard)
+            if shard is None:
+                shard = executor.submit(generate_shard, generation_function, sizes[next_shard], seeds[next_shard])
+
+            pending.append((next_shard, shard))
+            next_shard += 1
+
+        i, shard = pending.popleft()
+
+        if not isinstance(shard, CompactSamples):
+            shard = shard.result()
+            shard.tokenizer = tokenizer
+
+            if cache is not None:
+                cache.save(name, cache_key, i, shard)
+
+        yield from shard
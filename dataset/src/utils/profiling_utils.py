@@ -0,0 +1,146 @@
+import cProfile
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILING_MODES = ["cprofile", "sampling"]
+# environment variables enabling the profiling of an entry point (without changing its command line)
+PROFILE_MODE_ENV_VARIABLE = "PROFILE_MODE"
+PROFILE_OUTPUT_ENV_VARIABLE = "PROFILE_OUTPUT"
+# interval between two samples of the sampling profiler (in seconds)
+SAMPLING_INTERVAL = 0.005
+# modules of the intents scripts (e.g. _3_request_money.request_money_script)
+INTENT_MODULE_REGEX = re.compile(r"(?:^|[;\[])(_\d+_[a-z_]+(?:\.[a-z_]+)*)")
+# generic functions running the code of an intent script -> their local variable holding a function of that script
+INTENT_FUNCTIONS_LOCALS = {
+    "generate_intent_shards": "generation_function",
+    "generate_grouped_intent_sentences_and_BIO_tokens": "sample_generation_function"
+}
+
+def frame_name(frame):
+    """
+    Name of the function of a frame, qualified with its module (e.g. _3_request_money.request_money_script:pick_request_money_sample).
+    The generic generation functions are tagged with the module of the intent they are running (e.g.
+    utils.utils:generate_grouped_intent_sentences_and_BIO_tokens[_3_request_money.request_money_script]), so that
+    the time spent in the templates and entities of each intent is attributed to its own module
+    """
+    module = frame.f_globals.get("__name__", "?")
+    name = "%s:%s" % (module, getattr(frame.f_code, "co_qualname", frame.f_code.co_name))
+
+    if frame.f_code.co_name in INTENT_FUNCTIONS_LOCALS:
+        intent_function = frame.f_locals.get(INTENT_FUNCTIONS_LOCALS[frame.f_code.co_name])
+        name += "[%s]" % getattr(intent_function, "__module__", "?")
+
+    return name
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler: a thread periodically samples the call stack of the profiled thread,
+    counting the (collapsed) stacks, which can be rendered as flame graphs (e.g. with flamegraph.pl or speedscope)
+    args:
+    - interval: time between two samples (in seconds)
+    - thread_id: identifier of the profiled thread (by default, the main thread)
+    """
+
+    def __init__(self, interval=SAMPLING_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = threading.main_thread().ident if thread_id is None else thread_id
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.sample_loop, name="sampling-profiler", daemon=True)
+
+    def sample_loop(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+
+            if len(stack) > 0:
+                # (root first)
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def intents_samples(self):
+        """
+        Number of samples attributed to each intent module, i.e. whose innermost intent frame is in that module
+        - output: a Counter module name -> number of samples
+        """
+        counts = Counter()
+
+        for stack, count in self.stacks.items():
+            intent_modules = INTENT_MODULE_REGEX.findall(stack)
+            counts[intent_modules[-1] if len(intent_modules) > 0 else "(other)"] += count
+
+        return counts
+
+    def write_collapsed_stacks(self, filepath):
+        with open(filepath, "w") as file:
+            for stack, count in sorted(self.stacks.items()):
+                file.write("%s %d\n" % (stack, count))
+
+def write_sampled_profile(profiler, output_prefix):
+    """
+    Write the collapsed stacks of a SamplingProfiler in output_prefix.folded, and print the share of the samples of each intent
+    """
+    profiler.write_collapsed_stacks(output_prefix + ".folded")
+    print("Collapsed stacks written in %s.folded" % output_prefix, file=sys.stderr)
+
+    total = max(sum(profiler.stacks.values()), 1)
+    for module, count in profiler.intents_samples().most_common():
+        print("%-50s %6.1f%%" % (module, 100 * count / total), file=sys.stderr)
+
+@contextmanager
+def profiling(mode, output_prefix):
+    """
+    Profile the code run in the context:
+    - "cprofile": deterministic profile (with cProfile), written in output_prefix.pstats, plus the sampled
+      stacks as in the "sampling" mode (cProfile only records the direct callers of each function)
+    - "sampling": collapsed stacks sampled by a SamplingProfiler, written in output_prefix.folded (with the
+      share of the samples of each intent printed)
+    - None: no profiling
+    """
+    if mode is None:
+        yield
+        return
+
+    if mode not in PROFILING_MODES:
+        raise ValueError("unknown profiling mode '%s' (expected one of %s)" % (mode, ", ".join(PROFILING_MODES)))
+
+    os.makedirs(os.path.dirname(output_prefix) or ".", exist_ok=True)
+    sampling_profiler = SamplingProfiler()
+    deterministic_profiler = cProfile.Profile() if mode == "cprofile" else None
+
+    sampling_profiler.start()
+    if deterministic_profiler is not None:
+        deterministic_profiler.enable()
+
+    try:
+        yield
+    finally:
+        if deterministic_profiler is not None:
+            deterministic_profiler.disable()
+            deterministic_profiler.dump_stats(output_prefix + ".pstats")
+            print("Profile written in %s.pstats (python -m pstats %s.pstats)" % (output_prefix, output_prefix), file=sys.stderr)
+
+        sampling_profiler.stop()
+        write_sampled_profile(sampling_profiler, output_prefix)
+
+def profiling_from_environment(default_output_prefix):
+    """
+    Profiling context enabled by the PROFILE_MODE environment variable (with the output prefix
+    given by PROFILE_OUTPUT, or default_output_prefix)
+    """
+    return profiling(os.environ.get(PROFILE_MODE_ENV_VARIABLE) or None,
+                     os.environ.get(PROFILE_OUTPUT_ENV_VARIABLE) or default_output_prefix)
@@ -0,0 +1,188 @@
+import csv
+import io
+import mmap
+import os
+import random
+import unicodedata
+from array import array
+
+# extension of the sidecar files storing the index of a csv file
+INDEX_FILE_EXTENSION = ".idx"
+
+def build_csv_index(csv_filepath, grouped_rows):
+    """
+    Make one pass over a csv file (as written by write_grouped_intent_and_tokens_datasets()) to find the byte
+    offsets of its records: each row is a record in intents.csv, while in named_entities.csv the records are
+    the groups of rows (one per token) separated by a blank row.
+    args:
+    - grouped_rows: True if the records are groups of rows separated by blank rows
+    - output: an array('Q') of num_records + 1 offsets: record i spans the bytes [offsets[i], offsets[i+1])
+    """
+    offsets = array("Q", [0])
+    position = 0
+    record_has_rows = False
+
+    with open(csv_filepath, "rb") as file:
+        for line in file:
+            position += len(line)
+            is_blank = len(line.strip(b"\r\n")) == 0
+
+            if not grouped_rows:
+                if not is_blank:
+                    offsets.append(position)
+                else:
+                    # (blank rows are not records: skip them)
+                    offsets[-1] = position
+            elif is_blank:
+                # end of the sentence (even if it had no tokens)
+                offsets.append(position)
+                record_has_rows = False
+            else:
+                record_has_rows = True
+
+    if grouped_rows and record_has_rows:
+        # the last sentence is not followed by a blank row
+        offsets.append(position)
+
+    return offsets
+
+def load_csv_index(csv_filepath, grouped_rows):
+    """
+    Load the index of a csv file from its sidecar file (csv_filepath + INDEX_FILE_EXTENSION), building
+    and saving it if it does not exist or if it is stale. The sidecar file starts with the size and the
+    modification time (in ns) of the indexed csv file, followed by its offsets (see build_csv_index())
+    """
+    index_filepath = csv_filepath + INDEX_FILE_EXTENSION
+    csv_stat = os.stat(csv_filepath)
+    header = array("Q", [csv_stat.st_size, csv_stat.st_mtime_ns])
+
+    if os.path.exists(index_filepath):
+        index = array("Q")
+        with open(index_filepath, "rb") as file:
+            index.frombytes(file.read())
+
+        if index[:2] == header:
+            return index[2:]
+
+    offsets = build_csv_index(csv_filepath, grouped_rows)
+
+    with open(index_filepath, "wb") as file:
+        (header + offsets).tofile(file)
+
+    return offsets
+
+def normalize_for_comparison(text):
+    # lowercase, strip accents and remove whitespaces, as the (uncased) tokenizer does
+    text = "".join(c for c in unicodedata.normalize("NFD", text.lower()) if unicodedata.category(c) != "Mn")
+    return "".join(text.split())
+
+def tokens_match_sentence(tokens, sentence):
+    """
+    Check (loosely) that some wordpieces come from the given sentence: the sentence must be
+    the concatenation of the tokens (apart from the whitespaces, the case and the accents)
+    """
+    if "[UNK]" in tokens:
+        # the original text of the unknown tokens is lost: just compare the known prefix
+        tokens = tokens[:tokens.index("[UNK]")]
+        return normalize_for_comparison(sentence).startswith("".join(token.removeprefix("##") for token in tokens))
+
+    return normalize_for_comparison(sentence) == "".join(token.removeprefix("##") for token in tokens)
+
+class IndexedNamedEntitiesReader:
+    """
+    Random-access reader of the named_entities.csv file (and, optionally, of the corresponding intents.csv file)
+    in the format written by write_grouped_intent_and_tokens_datasets(), without converting it: the files are
+    indexed once (the indices are saved as sidecar files) and memory-mapped, and the i-th sentence is read in O(1).
+    The reader can be pickled (e.g. sent to data loading worker processes): the files are mapped again.
+    args:
+    - ner_csv_filepath: path of named_entities.csv
+    - intents_csv_filepath: path of intents.csv (optional), whose row i is the sentence i of named_entities.csv
+    - verify: check that the tokens of each read sentence match the intents row with the same index
+    """
+
+    def __init__(self, ner_csv_filepath, intents_csv_filepath=None, verify=True):
+        self.ner_csv_filepath = ner_csv_filepath
+        self.intents_csv_filepath = intents_csv_filepath
+        self.verify = verify
+
+        self.ner_offsets, self.ner_file, self.ner_map = self.open_indexed_csv(ner_csv_filepath, grouped_rows=True)
+        self.intents_offsets, self.intents_file, self.intents_map = None, None, None
+
+        if intents_csv_filepath is not None:
+            self.intents_offsets, self.intents_file, self.intents_map = self.open_indexed_csv(intents_csv_filepath, grouped_rows=False)
+
+            if len(self.intents_offsets) != len(self.ner_offsets):
+                self.close()
+                raise ValueError("%s has %d sentences, but %s has %d rows" % (ner_csv_filepath, len(self.ner_offsets) - 1,
+                                                                               intents_csv_filepath, len(self.intents_offsets) - 1))
+
+    @staticmethod
+    def open_indexed_csv(csv_filepath, grouped_rows):
+        offsets = load_csv_index(csv_filepath, grouped_rows)
+        file = open(csv_filepath, "rb")
+
+        # (an empty file cannot be mapped)
+        file_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] > 0 else b""
+        return offsets, file, file_map
+
+    def __getstate__(self):
+        return dict(ner_csv_filepath=self.ner_csv_filepath, intents_csv_filepath=self.intents_csv_filepath, verify=self.verify)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self.ner_offsets) - 1
+
+    def read_rows(self, file_map, offsets, i):
+        data = file_map[offsets[i]:offsets[i + 1]].decode("utf-8")
+        # (the records are split at "\n" only, as the offsets: str.splitlines() would split the fields at "\r", "\x0b", "\u2028", ...)
+        return [row for row in csv.reader(io.StringIO(data, newline="")) if len(row) > 0]
+
+    def __getitem__(self, i):
+        """
+        Read the i-th sentence
+        - output: a (sentence, intent, tokens, tokens_labels) element, as the ones generated by the intents
+          scripts (sentence and intent are None if there is no intents csv file)
+        """
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("sentence index out of range")
+
+        ner_rows = self.read_rows(self.ner_map, self.ner_offsets, i)
+        tokens = [row[0] for row in ner_rows]
+        tokens_labels = [row[1] for row in ner_rows]
+
+        if self.intents_map is None:
+            return None, None, tokens, tokens_labels
+
+        sentence, intent_label, _ = self.read_rows(self.intents_map, self.intents_offsets, i)[0]
+
+        if self.verify and not tokens_match_sentence(tokens, sentence):
+            raise ValueError("Sentence %d of %s does not match row %d of %s: %r vs %r" %
+                             (i, self.ner_csv_filepath, i, self.intents_csv_filepath, tokens, sentence))
+
+        return sentence, intent_label, tokens, tokens_labels
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def sample(self, num, rng=random):
+        """
+        Read num random sentences (without replacement)
+        """
+        return [self[i] for i in rng.sample(range(len(self)), num)]
+
+    def close(self):
+        for file_map, file in [(self.ner_map, self.ner_file), (self.intents_map, self.intents_file)]:
+            if isinstance(file_map, mmap.mmap):
+                file_map.close()
+            if file is not None:
+                file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,84 @@
+from array import array
+from utils.utils import INTENT_LABEL_NUM, ENTITY_LABEL_NUM
+
+# numbers -> labels
+INTENT_NUM_LABEL = {num: label for label, num in INTENT_LABEL_NUM.items()}
+ENTITY_NUM_LABEL = {num: label for label, num in ENTITY_LABEL_NUM.items()}
+
+class CompactSamples:
+    """
+    Compact (struct-of-arrays) container of (sentence, intent, tokens, tokens_labels) elements, to keep
+    lots of them in memory: instead of a tuple of strings and lists of strings per sample, all the samples
+    share a few flat arrays, with the sentences encoded in utf-8, the tokens as their vocab ids (2 bytes each,
+    for vocabs of at most 65536 tokens), the BIO labels and the intents as their numbers (1 byte each).
+    The elements are decoded back into strings only when they are read.
+    The tokenizer (used to convert tokens into ids and back) is not pickled with the samples: it must be set
+    again after unpickling them.
+    args:
+    - tokenizer: the tokenizer which produced the tokens
+    - elements: an iterable of elements to be initially added
+    """
+
+    def __init__(self, tokenizer, elements=()):
+        self.tokenizer = tokenizer
+
+        self.sentences = bytearray()
+        self.sentences_offsets = array("Q", [0])
+        self.tokens_ids = array("H" if len(tokenizer) <= 2**16 else "I")
+        self.tokens_offsets = array("Q", [0])
+        self.tokens_labels = array("B")
+        self.intents = array("B")
+
+        self.extend(elements)
+
+    def append(self, element):
+        sentence, intent_label, tokens, tokens_labels = element
+
+        self.sentences += sentence.encode("utf-8")
+        self.sentences_offsets.append(len(self.sentences))
+
+        self.tokens_ids.extend(self.tokenizer.convert_tokens_to_ids(tokens))
+        self.tokens_labels.extend(map(ENTITY_LABEL_NUM.__getitem__, tokens_labels))
+        self.tokens_offsets.append(len(self.tokens_ids))
+
+        self.intents.append(INTENT_LABEL_NUM[intent_label])
+
+    def extend(self, elements):
+        for element in elements:
+            self.append(element)
+
+    def __len__(self):
+        return len(self.intents)
+
+    def __getitem__(self, i):
+        """
+        Decode the i-th element
+        - output: a (sentence, intent, tokens, tokens_labels) tuple
+        """
+        if i < 0:
+            i += len(self)
+
+        sentence = self.sentences[self.sentences_offsets[i]:self.sentences_offsets[i + 1]].decode("utf-8")
+        start, end = self.tokens_offsets[i], self.tokens_offsets[i + 1]
+        tokens = self.tokenizer.convert_ids_to_tokens(self.tokens_ids[start:end].tolist())
+        tokens_labels = [ENTITY_NUM_LABEL[label] for label in self.tokens_labels[start:end]]
+
+        return sentence, INTENT_NUM_LABEL[self.intents[i]], tokens, tokens_labels
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def nbytes(self):
+        """
+        Memory used by the samples buffers, in bytes
+        """
+        buffers = [self.sentences_offsets, self.tokens_ids, self.tokens_offsets, self.tokens_labels, self.intents]
+        return len(self.sentences) + sum(buffer.itemsize * len(buffer) for buffer in buffers)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["tokenizer"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
@@ -0,0 +1,94 @@
+import hashlib
+import heapq
+import json
+import os
+from utils.utils import GroupedDatasetsCsvWriter, CSV_WRITE_BATCH_SIZE
+
+# name of the manifest describing the shards of a dataset
+MANIFEST_FILENAME = "manifest.json"
+
+def shard_filename(split_name, index, num_shards, extension=".csv"):
+    return "%s-%05d-of-%05d%s" % (split_name, index, num_shards, extension)
+
+def file_sha256(filepath, chunk_size=2**20):
+    sha256 = hashlib.sha256()
+
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+def write_sharded_grouped_datasets(grouped_elements, output_dirpath, num_shards, compression_extension="", batch_size=CSV_WRITE_BATCH_SIZE):
+    """
+    Write the grouped elements to num_shards pairs of intents and named entities csv files (in the same format of
+    write_grouped_intent_and_tokens_datasets()), consuming them one by one: each sentence is written to the shard
+    having the least data so far, so the shards have (almost) the same size. A JSON manifest describes the shards:
+    for each of them, the number of sentences and tokens, the count of each intent, and the size (in bytes) and
+    the sha256 hash of each file.
+    args:
+    - compression_extension: "" (no compression), ".gz" or ".zst"
+    - output: the manifest (as a dict)
+    """
+    os.makedirs(output_dirpath, exist_ok=True)
+
+    shards = []
+    writers = []
+
+    for i in range(num_shards):
+        intents_filename = shard_filename("intents", i, num_shards, ".csv" + compression_extension)
+        ner_filename = shard_filename("named_entities", i, num_shards, ".csv" + compression_extension)
+
+        shards.append({
+            "index": i,
+            "num_sentences": 0,
+            "num_tokens": 0,
+            "intents_counts": {},
+            "files": {
+                "intents": {"path": intents_filename},
+                "named_entities": {"path": ner_filename}
+            }
+        })
+        writers.append(GroupedDatasetsCsvWriter(os.path.join(output_dirpath, intents_filename),
+                                                os.path.join(output_dirpath, ner_filename), batch_size))
+
+    # (written chars, shard index) of each shard: the least loaded shard is on top
+    shards_heap = [(0, i) for i in range(num_shards)]
+
+    try:
+        for element in grouped_elements:
+            shard_size, i = shards_heap[0]
+            element_size = writers[i].write(element)
+            heapq.heapreplace(shards_heap, (shard_size + element_size, i))
+
+            _, intent_label, sentence_tokens, _ = element
+            shards[i]["num_sentences"] += 1
+            shards[i]["num_tokens"] += len(sentence_tokens)
+            shards[i]["intents_counts"][intent_label] = shards[i]["intents_counts"].get(intent_label, 0) + 1
+    finally:
+        for writer in writers:
+            writer.close()
+
+    for shard in shards:
+        for file_info in shard["files"].values():
+            filepath = os.path.join(output_dirpath, file_info["path"])
+            file_info["bytes"] = os.path.getsize(filepath)
+            file_info["sha256"] = file_sha256(filepath)
+
+    intents_counts = {}
+    for shard in shards:
+        for intent_label, count in shard["intents_counts"].items():
+            intents_counts[intent_label] = intents_counts.get(intent_label, 0) + count
+
+    manifest = {
+        "num_shards": num_shards,
+        "num_sentences": sum(shard["num_sentences"] for shard in shards),
+        "num_tokens": sum(shard["num_tokens"] for shard in shards),
+        "intents_counts": intents_counts,
+        "shards": shards
+    }
+
+    with open(os.path.join(output_dirpath, MANIFEST_FILENAME), "w") as file:
+        json.dump(manifest, file, indent=4)
+
+    return manifest
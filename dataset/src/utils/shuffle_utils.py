@@ -0,0 +1,90 @@
+import os
+import pickle
+import random
+import sys
+import tempfile
+from array import array
+from utils.utils import mix_grouped_elements
+from utils.samples_utils import CompactSamples
+
+# default memory budget of the external shuffle: 512 MB
+SHUFFLE_MEMORY_BUDGET = 512 * 2**20
+
+# sizes used to estimate the memory used by the elements: sys.getsizeof() cannot be used on them, as the
+# runs must not depend on how the elements were built (e.g. unpickled lists have no spare capacity, and
+# non-ascii strings also cache their utf-8 encoding once they are pickled)
+EMPTY_TUPLE_SIZE = sys.getsizeof(())
+EMPTY_LIST_SIZE = sys.getsizeof([])
+EMPTY_STR_SIZE = sys.getsizeof("")
+POINTER_SIZE = 8
+
+def estimate_element_size(element):
+    """
+    Estimate the memory used by a (sentence, intent, tokens, tokens_labels) element, in bytes
+    (the labels strings are shared among all the elements, so only their lists are counted)
+    """
+    sentence, intent_label, tokens, tokens_labels = element
+    return EMPTY_TUPLE_SIZE + POINTER_SIZE * len(element) + \
+        EMPTY_STR_SIZE + len(sentence) + \
+        EMPTY_LIST_SIZE + POINTER_SIZE * len(tokens) + EMPTY_STR_SIZE * len(tokens) + sum(map(len, tokens)) + \
+        EMPTY_LIST_SIZE + POINTER_SIZE * len(tokens_labels)
+
+def write_run(elements, run_filepath):
+    with open(run_filepath, "wb") as file:
+        for element in elements:
+            pickle.dump(element, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+def read_run(run_filepath):
+    with open(run_filepath, "rb") as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
+
+def shuffled_run(run, rng=random):
+    # shuffle the indices of the run (a list of elements or CompactSamples) instead of the elements themselves
+    permutation = array("Q", range(len(run)))
+    rng.shuffle(permutation)
+    return (run[i] for i in permutation)
+
+def external_shuffle(elements, memory_budget=SHUFFLE_MEMORY_BUDGET, rng=random, temp_dir=None, tokenizer=None):
+    """
+    Lazily shuffle a stream of grouped elements too big to be kept in memory: the elements are split
+    in runs of (about) memory_budget bytes, each run is shuffled in memory and spilled to a temporary file,
+    then the runs are interleaved with a random k-way merge (taking the next element from a run with
+    probability proportional to the number of elements it has still to yield), which is equivalent to
+    a full shuffle. If the whole stream fits in the budget, nothing is written to disk.
+    args:
+    - elements: an iterable of (sentence, intent, tokens, tokens_labels) elements
+    - memory_budget: approximate maximum size of a run in memory, in bytes
+    - rng: the source of randomness (the random module itself, or a random.Random instance)
+    - temp_dir: directory where the runs are written (the default temporary directory if None)
+    - tokenizer: the tokenizer which produced the tokens: if given, the runs are kept in memory as
+      CompactSamples (so that many more elements fit in the budget)
+    """
+    with tempfile.TemporaryDirectory(prefix="shuffle_runs_", dir=temp_dir) as runs_dir:
+        runs = []
+        run = CompactSamples(tokenizer) if tokenizer is not None else []
+        run_size = 0
+
+        for element in elements:
+            run.append(element)
+            run_size = run.nbytes() if tokenizer is not None else run_size + estimate_element_size(element)
+
+            if run_size >= memory_budget:
+                run_filepath = os.path.join(runs_dir, "run_%d.pickle" % len(runs))
+                write_run(shuffled_run(run, rng), run_filepath)
+
+                runs.append((len(run), read_run(run_filepath)))
+                run = CompactSamples(tokenizer) if tokenizer is not None else []
+                run_size = 0
+
+        if len(runs) == 0:
+            # the whole stream fits in memory
+            yield from shuffled_run(run, rng)
+            return
+
+        # the last run is kept in memory
+        runs.append((len(run), shuffled_run(run, rng)))
+        yield from mix_grouped_elements(runs, rng)
@@ -1,5 +1,13 @@
 import csv
+import gzip
+import io
+import itertools
+import os
+import random
 import re
+from functools import lru_cache
+import numpy as np
+from utils.wordpiece import is_whitespace, is_punctuation
 
 # Entity labels
 AMOUNT_ENTITY_LABEL = "AMOUNT"
@@ -50,70 +58,120 @@ def trim_punctuation(sentence):
 
 def write_dataset(unique_sentences, csv_filename):
     list_of_sentences = [[x] for x in unique_sentences]
+    os.makedirs(os.path.dirname(csv_filename) or ".", exist_ok=True)
 
     with open(csv_filename, mode='w', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
         writer.writerow(["Sentence"])  # Header    
         writer.writerows(list_of_sentences)
 
+def generate_BIO_labels(label, num_tokens):
+    """
+    Labels of the tokens of a single piece of sentence, according to the BIO scheme: 
+    all 'O' (Outside) if the piece is not an entity (label is None)
+    """
+    if label is None:
+        return ["O"] * num_tokens
+
+    return ["B-%s" % label] + ["I-%s" % label] * (num_tokens - 1) if num_tokens > 0 else []
+
+# a placeholder is any name enclosed in curly braces, e.g. {amount}
+PLACEHOLDER_REGEX = re.compile(r"(\{\w+\})")
+
+class CompiledTemplate:
+    """
+    A sentence template parsed once into literal fragments and slot references, so that
+    the (many) samples rendered from it do not need to parse the template again.
+    args:
+    - template: a string containing placeholders, each one enclosed in curly braces
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        # list of (text, slot) pairs: slot is None for literal fragments, otherwise 
+        # it is the placeholder name and text is the placeholder as written in the template
+        self.fragments = []
+
+        for piece in PLACEHOLDER_REGEX.split(template):
+            if len(piece) == 0:
+                continue
+
+            if PLACEHOLDER_REGEX.fullmatch(piece):
+                self.fragments.append((piece, piece[1:-1]))
+            else:
+                self.fragments.append((piece, None))
+
+        self.slots = frozenset(slot for _, slot in self.fragments if slot is not None)
+
+    def __repr__(self):
+        return "CompiledTemplate(%r)" % self.template
+
+    def fill(self, **kwargs):
+        """
+        Substitute the placeholders with the given values, without tokenizing them.
+        args:
+        - kwargs: same as in render()
+        - output: a list of (text, label) pieces, where label is None for the literal pieces
+        """
+        if len(kwargs) == 0:
+            return [(self.template, None)]
+
+        pieces = []
+
+        for text, slot in self.fragments:
+            if slot is not None and slot in kwargs:
+                # retrieve the placeholder value and the corresponding label
+                pieces.append((kwargs[slot][0], kwargs[slot][1]))
+            else:
+                pieces.append((text, None))
+
+        return pieces
+
+    def render(self, tokenizer, **kwargs):
+        """
+        Format the template and generate the corresponding (labelled) tokens, according to the BIO scheme.
+        args:
+        - tokenizer: the object used to tokenize a string
+        - kwargs: a set of key-value pairs, one for each placeholder, having as key the name of the
+          placeholder and as value an iterable of two values: (1) the value to substitute to the
+          placeholder, and (2) a string representing the corresponding token label
+        - output: the formatted sentence, a list of the corresponding bert tokens, and a list of the corresponding BIO labels
+        """
+        sentence = ""
+        sentence_tokens = []
+        tokens_labels = []
+
+        for text, label in self.fill(**kwargs):
+            piece_tokens = tokenizer.tokenize(text)
+
+            # update sentence and add the tokens to the result
+            sentence += text
+            sentence_tokens += piece_tokens
+            tokens_labels += generate_BIO_labels(label, len(piece_tokens))
+
+        return sentence, sentence_tokens, tokens_labels
+
+@lru_cache(maxsize=None)
+def compile_template(template: str):
+    return CompiledTemplate(template)
+
 def generate_BIO_tokens_from_template(template: str, tokenizer, **kwargs):
     """
     Given a sentence template with placeholders, generate the both the formatted sentence and 
     the corresponding (labelled) tokens, according to the BIO scheme.
     args:
-    - template: a string containing placeholders, each one enclosed in curly braces
+    - template: a string containing placeholders, each one enclosed in curly braces (or an already CompiledTemplate)
     - tokenizer: the object used to tokenize a string
     - kwargs: a set of key-value pairs, one for each placeholder, having as key the name of the
       placeholder (as occurs in the template) and as value an iterable of two values: 
       (1) the value to substitute to the placeholder, and (2) a string representing the corresponding token label
     - output: the formatted sentence, a list of the corresponding bert tokens, and a list of the corresponding BIO labels
     """
-    if len(kwargs) == 0:
-        sentence = template
-        tokens = tokenizer.tokenize(sentence)
-        tokens_labels = ["O"] * len(tokens)
-        return sentence, tokens, tokens_labels
-
-    placeholders = {"{%s}" % x for x in kwargs.keys()}
-    placeholders_regex = "(" + "|".join(["\{%s\}" % x for x in kwargs.keys()]) + ")"
-    
-    # split the template using the placeholders
-    template_pieces = re.split(placeholders_regex, template)
-    
-    sentence = ""
-    sentence_tokens = []
-    tokens_labels = []
+    if not isinstance(template, CompiledTemplate):
+        # templates are parsed just once, and then reused
+        template = compile_template(template)
 
-    for piece in template_pieces:
-        if piece is None or len(piece) == 0:
-            continue
-
-        if piece in placeholders:
-            placeholder_key = piece.removeprefix("{").removesuffix("}")
-
-            # retrieve the placeholder value and the corresponding label
-            placeholder_value = kwargs[placeholder_key][0]
-            placeholder_label = kwargs[placeholder_key][1]
-
-            # create BERT tokens for the entity and the corresponding labels, according to the BIO scheme
-            piece_tokens = tokenizer.tokenize(placeholder_value)
-            piece_tokens_labels = ["B-%s" % placeholder_label] + ["I-%s" % placeholder_label for _ in range(len(piece_tokens) - 1)]
-
-            # update sentence
-            sentence += placeholder_value
-        else:
-            # create BERT tokens for this piece and the corresponding labels, which are all 'O' (Outside)
-            piece_tokens = tokenizer.tokenize(piece)
-            piece_tokens_labels = ["O"] * len(piece_tokens)
-
-            # update sentence
-            sentence += piece
-        
-        # add them to the result
-        sentence_tokens += piece_tokens
-        tokens_labels += piece_tokens_labels
-    
-    return sentence, sentence_tokens, tokens_labels
+    return template.render(tokenizer, **kwargs)
 
 def generate_intent_sentences_and_BIO_tokens(num_sentences, tokenizer, intent_generation_function):
     """
@@ -136,23 +194,428 @@ def generate_intent_sentences_and_BIO_tokens(num_sentences, tokenizer, intent_ge
 
     return sentences, sentences_tokens, sentences_tokens_labels
 
-def generate_grouped_intent_sentences_and_BIO_tokens(num_sentences, tokenizer, intent_label, intent_generation_function):
+def tokenize_batch(tokenizer, texts):
     """
-    Generate a certain number of random sentences expressing an intent, and the corresponding
-    tokens and labels. Obtain an iterable of (sentence, intent, tokens, tokens_labels)
+    Tokenize a list of strings with a single call to the tokenizer (instead of one call per string)
+    """
+    if len(texts) == 0:
+        return []
+
+    encodings = tokenizer(texts, add_special_tokens=False, is_split_into_words=False)
+    return [tokenizer.convert_ids_to_tokens(ids) for ids in encodings["input_ids"]]
+
+def tokenize_batch_with_offsets(tokenizer, texts):
+    """
+    Same as tokenize_batch(), also returning the (start, end) character span of each token in its text
+    (it requires a tokenizer supporting return_offsets_mapping)
+    - output: a list of tokens and a list of token spans, for each text
+    """
+    if len(texts) == 0:
+        return [], []
+
+    encodings = tokenizer(texts, add_special_tokens=False, is_split_into_words=False, return_offsets_mapping=True)
+    return [tokenizer.convert_ids_to_tokens(ids) for ids in encodings["input_ids"]], encodings["offset_mapping"]
+
+def supports_offsets_mapping(tokenizer):
+    # offsets mapping is available on the (HuggingFace) fast tokenizers, and on the ones declaring it (e.g. WordPieceTokenizer)
+    return getattr(tokenizer, "is_fast", False) or getattr(tokenizer, "supports_offsets_mapping", False)
+
+class EntityPool:
+    """
+    A finite pool of entity values (e.g. the bank names), sharing the same entity label: each value
+    is tokenized just once, and its tokens are stored together with the corresponding BIO labels
+    and, if the tokenizer supports it, with the character span of each token in the value.
+    args:
+    - values: the values of the pool (duplicates are stored once)
+    - label: the entity label of all the values
+    - tokenizer: the object used to tokenize a string
+    """
+
+    def __init__(self, values, label, tokenizer):
+        self.label = label
+        self.values = list(dict.fromkeys(values))
+        self.indices = {value: i for i, value in enumerate(self.values)}
+
+        if supports_offsets_mapping(tokenizer):
+            self.tokens, self.tokens_offsets = tokenize_batch_with_offsets(tokenizer, self.values)
+        else:
+            self.tokens, self.tokens_offsets = tokenize_batch(tokenizer, self.values), None
+
+        self.tokens_labels = [generate_BIO_labels(label, len(value_tokens)) for value_tokens in self.tokens]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return value in self.indices
+
+    def lookup(self, value):
+        """
+        Retrieve the (tokens, BIO labels) pair of a value, or None if the value is not in the pool
+        """
+        i = self.indices.get(value)
+
+        if i is None:
+            return None
+
+        return self.tokens[i], self.tokens_labels[i]
+
+    def lookup_offsets(self, value):
+        """
+        Retrieve the (tokens, token spans) pair of a value, or None if the value is not in the pool
+        (or if the spans were not recorded)
+        """
+        i = self.indices.get(value)
+
+        if i is None or self.tokens_offsets is None:
+            return None
+
+        return self.tokens[i], self.tokens_offsets[i]
+
+# values of the finite entity pools (entity label -> list of lists of values), registered by the modules defining them
+entity_pools_values = {}
+# pools already tokenized, for each tokenizer: id(tokenizer) -> (tokenizer, {entity label -> EntityPool})
+tokenized_entity_pools = {}
+
+def register_entity_pool(label, values):
+    """
+    Add some values to the pool of the given entity label, so that they are tokenized just once
+    (the list is not copied: the pool is built from its content when it is first used)
+    """
+    entity_pools_values.setdefault(label, []).append(values)
+    tokenized_entity_pools.clear()
+
+def get_entity_pools(tokenizer):
+    """
+    Retrieve the registered entity pools, tokenized with the given tokenizer (the first time it is used)
+    """
+    if id(tokenizer) not in tokenized_entity_pools:
+        pools = {
+            label: EntityPool(itertools.chain.from_iterable(values_lists), label, tokenizer) 
+            for label, values_lists in entity_pools_values.items()
+        }
+        tokenized_entity_pools[id(tokenizer)] = (tokenizer, pools)
+
+    return tokenized_entity_pools[id(tokenizer)][1]
+
+def generate_BIO_tokens_from_templates_batch(samples, tokenizer):
+    """
+    Batched version of generate_BIO_tokens_from_template(): all the pieces of all the samples
+    are tokenized together, with a single call to the tokenizer, and the tokens are then scattered
+    back to their own sample.
+    args:
+    - samples: a list of (template, kwargs) pairs, where template is a CompiledTemplate and kwargs is a dict
+      having the same meaning of the kwargs of generate_BIO_tokens_from_template()
+    - tokenizer: the object used to tokenize a string
+    - output: a list of (sentence, tokens, BIO labels), one for each sample
+    """
+    samples_pieces = [template.fill(**kwargs) for template, kwargs in samples]
+    entity_pools = get_entity_pools(tokenizer)
+
+    # collect the (distinct) pieces of the whole batch to be tokenized: literal pieces are repeated 
+    # very often, while the entities coming from a pool have been already tokenized
+    pieces_indices = {}
+    for pieces in samples_pieces:
+        for text, label in pieces:
+            if label in entity_pools and text in entity_pools[label]:
+                continue
+
+            if text not in pieces_indices:
+                pieces_indices[text] = len(pieces_indices)
+
+    pieces_tokens = tokenize_batch(tokenizer, list(pieces_indices.keys()))
+
+    # scatter tokens and labels back to each sample
+    results = []
+
+    for pieces in samples_pieces:
+        sentence = ""
+        sentence_tokens = []
+        tokens_labels = []
+
+        for text, label in pieces:
+            pooled_entity = entity_pools[label].lookup(text) if label in entity_pools else None
+
+            if pooled_entity is not None:
+                # just concatenate the cached tokens and labels
+                piece_tokens, piece_tokens_labels = pooled_entity
+            else:
+                piece_tokens = pieces_tokens[pieces_indices[text]]
+                piece_tokens_labels = generate_BIO_labels(label, len(piece_tokens))
+
+            sentence += text
+            sentence_tokens += piece_tokens
+            tokens_labels += piece_tokens_labels
+
+        results.append((sentence, sentence_tokens, tokens_labels))
+
+    return results
+
+def is_words_boundary(text, i):
+    """
+    Check if the tokens of a text never cross the position i: the BERT tokenizers split the words at
+    whitespace and punctuation chars, so it is enough that one of the chars around it is one of them
+    """
+    return i == 0 or i == len(text) or any(is_whitespace(char) or is_punctuation(char) for char in text[i - 1:i + 1])
+
+def label_tokens_from_offsets(tokens_offsets, entities_spans):
+    """
+    Assign the BIO labels to the tokens of a sentence, given the character span of each token
+    and the (start, end, label) span of each entity, both sorted by position
+    """
+    tokens_labels = []
+    span_index = 0
+    labelled_span_index = -1
+
+    for token_start, token_end in tokens_offsets:
+        while span_index < len(entities_spans) and entities_spans[span_index][1] <= token_start:
+            span_index += 1
+
+        if span_index < len(entities_spans) and entities_spans[span_index][0] < token_end:
+            # the token overlaps the entity: it is the Beginning of it, or it is Inside it
+            label = entities_spans[span_index][2]
+            tokens_labels.append(("I-%s" if span_index == labelled_span_index else "B-%s") % label)
+            labelled_span_index = span_index
+        else:
+            tokens_labels.append("O")
+
+    return tokens_labels
+
+def generate_BIO_tokens_from_offsets_batch(samples, tokenizer):
+    """
+    Alternative to generate_BIO_tokens_from_templates_batch(): each sample is first rendered as a whole
+    sentence, recording the character span of each entity, and then the sentence is tokenized as the
+    model preprocessor does; the BIO labels are assigned looking at the character offsets of the tokens.
+    The entities coming from a pool are not tokenized again, when they are delimited by whitespace or
+    punctuation in the sentence: their tokens and token spans are taken from the pool, and only the text
+    between them is tokenized (the distinct texts of the whole batch, with a single call to the tokenizer).
+    It requires a tokenizer supporting return_offsets_mapping (e.g. a fast tokenizer).
+    args:
+    - samples: a list of (template, kwargs) pairs, as in generate_BIO_tokens_from_templates_batch()
+    - tokenizer: the object used to tokenize a string
+    - output: a list of (sentence, tokens, BIO labels), one for each sample
     """
+    if len(samples) == 0:
+        return []
 
+    entity_pools = get_entity_pools(tokenizer)
+    sentences = []
+    sentences_spans = []
+    # segments of each sentence, in order: (start, text, None) for the text to be tokenized,
+    # or (start, text, pooled tokens and token spans) for the pooled entities
+    sentences_segments = []
+    texts_indices = {}
+
+    for template, kwargs in samples:
+        pieces = template.fill(**kwargs)
+        sentence = "".join(text for text, _ in pieces)
+        entities_spans = []
+        segments = []
+        start = 0
+        text_start = 0
+
+        for text, label in pieces:
+            end = start + len(text)
+
+            if label is not None:
+                entities_spans.append((start, end, label))
+
+                pooled_entity = entity_pools[label].lookup_offsets(text) if label in entity_pools else None
+
+                if pooled_entity is not None and is_words_boundary(sentence, start) and is_words_boundary(sentence, end):
+                    if text_start < start:
+                        segments.append((text_start, sentence[text_start:start], None))
+                    segments.append((start, text, pooled_entity))
+                    text_start = end
+
+            start = end
+
+        if text_start < len(sentence):
+            segments.append((text_start, sentence[text_start:], None))
+
+        for _, text, pooled_entity in segments:
+            if pooled_entity is None and text not in texts_indices:
+                texts_indices[text] = len(texts_indices)
+
+        sentences.append(sentence)
+        sentences_spans.append(entities_spans)
+        sentences_segments.append(segments)
+
+    texts_tokens, texts_offsets = tokenize_batch_with_offsets(tokenizer, list(texts_indices.keys()))
+    results = []
+
+    for sentence, entities_spans, segments in zip(sentences, sentences_spans, sentences_segments):
+        tokens = []
+        tokens_offsets = []
+
+        for segment_start, text, pooled_entity in segments:
+            if pooled_entity is None:
+                segment_tokens = texts_tokens[texts_indices[text]]
+                segment_offsets = texts_offsets[texts_indices[text]]
+            else:
+                segment_tokens, segment_offsets = pooled_entity
+
+            # (the token spans are relative to the segment)
+            tokens += segment_tokens
+            tokens_offsets += [(segment_start + token_start, segment_start + token_end) for token_start, token_end in segment_offsets]
+
+        results.append((sentence, tokens, label_tokens_from_offsets(tokens_offsets, entities_spans)))
+
+    return results
+
+# number of samples tokenized together by the batched generation functions
+BIO_BATCH_SIZE = 4096
+
+def generate_grouped_intent_sentences_and_BIO_tokens(num_sentences, tokenizer, intent_label, sample_generation_function, 
+                                                     batch_size=BIO_BATCH_SIZE, labelling_function=generate_BIO_tokens_from_templates_batch,
+                                                     rng=random):
+    """
+    Generate a certain number of random sentences expressing an intent, and the corresponding
+    tokens and labels. Obtain an iterator of (sentence, intent, tokens, tokens_labels).
+    The samples are lazily generated and tokenized in batches of (at most) batch_size elements,
+    so at most one batch is kept in memory.
+    args:
+    - sample_generation_function: a function returning a random (template, kwargs) pair, 
+      as accepted by generate_BIO_tokens_from_templates_batch(); it receives rng as argument
+    - labelling_function: the batched function used to tokenize and label the samples: 
+      generate_BIO_tokens_from_templates_batch() (the default, and the fastest one) or, opt-in,
+      generate_BIO_tokens_from_offsets_batch() (which tokenizes the text around the pooled entities as a whole)
+    - rng: the source of randomness (the random module itself, or a random.Random instance)
+    """
     sentences_count = 0
-    grouped_sentences_tokens_and_labels = []
 
     while sentences_count < num_sentences:
-        sentence, tokens, labels = intent_generation_function(tokenizer)
-        element = (sentence, intent_label, tokens, labels)
+        current_batch_size = min(batch_size, num_sentences - sentences_count)
+        samples = [sample_generation_function(rng) for _ in range(current_batch_size)]
 
-        grouped_sentences_tokens_and_labels.append(element)
-        sentences_count += 1
+        for sentence, tokens, labels in labelling_function(samples, tokenizer):
+            yield (sentence, intent_label, tokens, labels)
 
-    return grouped_sentences_tokens_and_labels
+        sentences_count += current_batch_size
+
+def mix_grouped_elements(streams, rng=random):
+    """
+    Lazily interleave some streams of grouped elements in a random order, replacing the concatenation
+    + shuffle of the whole dataset: at each step the next element is taken from one of the streams with
+    probability proportional to the number of elements it has still to yield. Since the elements of 
+    each stream are independent samples, this is equivalent to a full shuffle, but only the streams
+    themselves (i.e. one batch per stream) are kept in memory.
+    args:
+    - streams: a list of (num_elements, iterable) pairs
+    - rng: the source of randomness (the random module itself, or a random.Random instance)
+    """
+    iterators = [iter(stream) for _, stream in streams]
+    remaining = [num_elements for num_elements, _ in streams]
+    total_remaining = sum(remaining)
+
+    while total_remaining > 0:
+        # pick a stream, weighted by its remaining elements
+        r = rng.randrange(total_remaining)
+        i = 0
+
+        while r >= remaining[i]:
+            r -= remaining[i]
+            i += 1
+
+        element = next(iterators[i], None)
+
+        if element is None:
+            # the stream yielded less elements than expected: discard it
+            total_remaining -= remaining[i]
+            remaining[i] = 0
+            continue
+
+        remaining[i] -= 1
+        total_remaining -= 1
+        yield element
+
+class IntentMixer:
+    """
+    Interleave the (lazily generated) datasets of the intents according to some target ratios, 
+    without shuffling: the number of sentences of each intent is derived from its ratio, and the
+    sentences are taken from the intents streams either by sampling (each stream is picked with 
+    probability proportional to its remaining sentences, see mix_grouped_elements()) or by smooth 
+    weighted round-robin (deterministic: at any point of the mixed stream, the count of each intent 
+    differs from its target share by less than one sentence).
+    args:
+    - ratios: a dict intent label -> relative weight of the intent (e.g. {"yes": 1, "none": 4})
+    - num_sentences: total number of sentences of the mixed dataset
+    - method: "sampling" or "round_robin"
+    - rng: the source of randomness of the sampling (the random module itself, or a random.Random instance)
+    """
+
+    METHODS = ("sampling", "round_robin")
+
+    def __init__(self, ratios, num_sentences, method="sampling", rng=random):
+        if method not in IntentMixer.METHODS:
+            raise ValueError("Unknown mixing method '%s' (expected one of %s)" % (method, ", ".join(IntentMixer.METHODS)))
+        if any(weight < 0 for weight in ratios.values()) or sum(ratios.values()) <= 0:
+            raise ValueError("The intents ratios must be non-negative, and at least one positive")
+
+        self.ratios = dict(ratios)
+        self.num_sentences = num_sentences
+        self.method = method
+        self.rng = rng
+
+    def __repr__(self):
+        return "IntentMixer(%r, num_sentences=%d, method=%r)" % (self.ratios, self.num_sentences, self.method)
+
+    def counts(self):
+        """
+        Split the total number of sentences among the intents, proportionally to their ratios (largest remainder method)
+        - output: a dict intent label -> number of sentences of the intent
+        """
+        total_weight = sum(self.ratios.values())
+        quotas = {intent: self.num_sentences * weight / total_weight for intent, weight in self.ratios.items()}
+        counts = {intent: int(quota) for intent, quota in quotas.items()}
+
+        by_remainder = sorted(quotas, key=lambda intent: quotas[intent] - counts[intent], reverse=True)
+        for intent in by_remainder[:self.num_sentences - sum(counts.values())]:
+            counts[intent] += 1
+
+        return counts
+
+    def mix(self, streams):
+        """
+        Lazily interleave the intents streams.
+        args:
+        - streams: a dict intent label -> iterable of grouped elements, yielding (at least) counts()[intent] elements
+        """
+        counts = self.counts()
+        intents = [intent for intent in self.ratios if counts[intent] > 0]
+
+        if self.method == "sampling":
+            return mix_grouped_elements([(counts[intent], streams[intent]) for intent in intents], self.rng)
+
+        return self.round_robin([counts[intent] for intent in intents], [iter(streams[intent]) for intent in intents])
+
+    @staticmethod
+    def round_robin(counts, iterators):
+        # smooth weighted round-robin: at each step every stream gains its weight (its number of elements),
+        # and the stream with the highest credit is picked and pays the total weight; over the whole
+        # stream, each stream is then picked exactly its number of elements times
+        total_count = sum(counts)
+        credits = [0] * len(counts)
+        remaining = list(counts)
+        total_remaining = total_count
+
+        while total_remaining > 0:
+            for i, count in enumerate(counts):
+                credits[i] += count
+
+            i = max((i for i in range(len(counts)) if remaining[i] > 0), key=credits.__getitem__)
+            credits[i] -= total_count
+            element = next(iterators[i], None)
+
+            if element is None:
+                # the stream yielded less elements than expected: discard it
+                total_remaining -= remaining[i]
+                remaining[i] = 0
+                continue
+
+            remaining[i] -= 1
+            total_remaining -= 1
+            yield element
 
 def format_tokens_and_labels(tokens, token_labels):
     token_strings = []
@@ -170,31 +633,192 @@ def format_tokens_and_labels(tokens, token_labels):
     
     return token_strings, token_labels_strings
 
-def write_grouped_intent_and_tokens_datasets(grouped_elements, intents_csv_filepath, ner_csv_filepath):
-    # open files and create csv writer utilities
-    intents_file = open(intents_csv_filepath, "w")
-    ner_file = open(ner_csv_filepath, "w")
+# number of sentences formatted in memory before each write to the csv files
+CSV_WRITE_BATCH_SIZE = 4096
+
+# end of the named entities csv rows for each BIO label (the label and its number), precomputed once
+NER_ROW_ENDINGS = {label: ",%s,%d\r\n" % (label, num) for label, num in ENTITY_LABEL_NUM.items()}
+# chars requiring a csv field to be quoted (as csv.writer does, with the default dialect)
+CSV_QUOTING_REGEX = re.compile(r'[",\r\n]')
 
-    intents_writer = csv.writer(intents_file)
-    ner_writer = csv.writer(ner_file)
+def format_csv_field(field):
+    if CSV_QUOTING_REGEX.search(field) is None:
+        return field
+
+    return '"%s"' % field.replace('"', '""')
+
+def open_output_file(filepath):
+    """
+    Open a text file for writing, compressing it if its name ends with .gz (gzip) or .zst (zstandard)
+    """
+    if filepath.endswith(".gz"):
+        return gzip.open(filepath, "wt", newline="")
+
+    if filepath.endswith(".zst"):
+        # zstandard is only needed to write .zst files
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstandard is required to write .zst files (pip install zstandard)") from e
+
+        return zstandard.open(filepath, "wt", newline="")
+
+    return open(filepath, "w", newline="")
+
+class GroupedDatasetsCsvWriter:
+    """
+    Writer of grouped elements to an intents csv file and a named entities csv file: the rows of batch_size 
+    sentences are formatted in memory and written to each file at once; the files are compressed if their 
+    names end with .gz or .zst
+    """
+
+    def __init__(self, intents_csv_filepath, ner_csv_filepath, batch_size=CSV_WRITE_BATCH_SIZE):
+        self.intents_csv_filepath = intents_csv_filepath
+        self.ner_csv_filepath = ner_csv_filepath
+        self.batch_size = batch_size
+
+        self.intents_file = open_output_file(intents_csv_filepath)
+        self.ner_file = open_output_file(ner_csv_filepath)
+
+        # in-memory buffers of the current batch
+        self.intents_buffer = io.StringIO()
+        self.intents_writer = csv.writer(self.intents_buffer)
+        self.ner_sentences = []
+
+    def write(self, element):
+        """
+        Format the rows of an element (and write the batch, if complete)
+        - output: the number of chars of the element's rows
+        """
+        sentence, intent_label, sentence_tokens, sentence_tokens_labels = element
+
+        # one row per intent
+        intent_row_length = self.intents_writer.writerow((sentence, intent_label, INTENT_LABEL_NUM[intent_label]))
+
+        # one row per each token, and a new line after each sentence (almost no token needs to be quoted:
+        # check all the tokens of the sentence at once)
+        if CSV_QUOTING_REGEX.search("".join(sentence_tokens)) is not None:
+            sentence_tokens = map(format_csv_field, sentence_tokens)
+
+        ner_rows = "".join(map(str.__add__, sentence_tokens, map(NER_ROW_ENDINGS.__getitem__, sentence_tokens_labels))) + "\r\n"
+        self.ner_sentences.append(ner_rows)
+
+        if len(self.ner_sentences) == self.batch_size:
+            self.flush()
+
+        return intent_row_length + len(ner_rows)
+
+    def flush(self):
+        self.intents_file.write(self.intents_buffer.getvalue())
+        self.intents_buffer.seek(0)
+        self.intents_buffer.truncate()
+
+        self.ner_file.write("".join(self.ner_sentences))
+        self.ner_sentences.clear()
+
+    def close(self):
+        self.flush()
+        self.intents_file.close()
+        self.ner_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_grouped_intent_and_tokens_datasets(grouped_elements, intents_csv_filepath, ner_csv_filepath, batch_size=CSV_WRITE_BATCH_SIZE):
+    """
+    Write the grouped elements to the intents and named entities csv files, consuming them one by one
+    (grouped_elements can be any iterable, e.g. a generator), in batches of batch_size sentences
+    (see GroupedDatasetsCsvWriter)
+    """
+    with GroupedDatasetsCsvWriter(intents_csv_filepath, ner_csv_filepath, batch_size) as writer:
+        for element in grouped_elements:
+            writer.write(element)
+
+# default length of the pre-tensorized sequences (including [CLS] and [SEP])
+DEFAULT_MAX_SEQ_LEN = 64
+# NER label of the special tokens and of the padding (ignored by the loss functions of both TensorFlow and PyTorch)
+IGNORED_LABEL_ID = -100
+
+def write_grouped_tensors_dataset(grouped_elements, num_elements, tokenizer, output_dirpath, max_seq_len=DEFAULT_MAX_SEQ_LEN):
+    """
+    Write the grouped elements as pre-tensorized (memory-mappable) .npy files, ready to be fed to the model:
+    - input_ids.npy: (num_elements, max_seq_len) token ids, with [CLS] and [SEP], padded or truncated to max_seq_len
+    - attention_mask.npy: (num_elements, max_seq_len), 1 on the tokens and 0 on the padding
+    - ner_labels.npy: (num_elements, max_seq_len) BIO label numbers, IGNORED_LABEL_ID on [CLS], [SEP] and padding
+    - intent_labels.npy: (num_elements,) intent numbers
+    The arrays are filled while consuming the elements one by one (grouped_elements can be any iterable, e.g. a generator).
+    args:
+    - num_elements: the (expected) number of elements, to allocate the arrays on disk; if the elements are
+      less, the files are truncated afterwards (see truncate_npy_rows())
+    - tokenizer: the tokenizer which produced the tokens, used to convert them into ids
+    - output: the number of written elements, and the number of truncated sentences
+    """
+    os.makedirs(output_dirpath, exist_ok=True)
+    max_tokens = max_seq_len - 2
+
+    def create_array(name, shape, fill_value):
+        array = np.lib.format.open_memmap(os.path.join(output_dirpath, name + ".npy"), mode="w+", dtype=np.int32, shape=shape)
+        array[:] = fill_value
+        return array
+
+    arrays = {
+        "input_ids": create_array("input_ids", (num_elements, max_seq_len), tokenizer.pad_token_id),
+        "attention_mask": create_array("attention_mask", (num_elements, max_seq_len), 0),
+        "ner_labels": create_array("ner_labels", (num_elements, max_seq_len), IGNORED_LABEL_ID),
+        "intent_labels": create_array("intent_labels", (num_elements,), 0)
+    }
+
+    num_written = 0
+    num_truncated = 0
 
     for sentence, intent_label, sentence_tokens, sentence_tokens_labels in grouped_elements:
-        # write one row per intent
-        intent_label_num = INTENT_LABEL_NUM[intent_label]
-        intents_writer.writerow([sentence, intent_label, intent_label_num])
-
-        # write one row per each token
-        sentence_tokens_labels_nums = list(map(lambda label: ENTITY_LABEL_NUM[label], sentence_tokens_labels))
-        ner_writer.writerows(zip(sentence_tokens, sentence_tokens_labels, sentence_tokens_labels_nums))
-        # write a new line after each sentence
-        ner_writer.writerow([])
-
-    intents_file.close()
-    ner_file.close()
-        
-    
+        if num_written >= num_elements:
+            raise ValueError("More than %d elements to be written" % num_elements)
 
+        if len(sentence_tokens) > max_tokens:
+            num_truncated += 1
 
+        tokens_ids = tokenizer.convert_tokens_to_ids(sentence_tokens[:max_tokens])
+        sequence_len = len(tokens_ids) + 2
 
+        arrays["input_ids"][num_written, :sequence_len] = [tokenizer.cls_token_id] + tokens_ids + [tokenizer.sep_token_id]
+        arrays["attention_mask"][num_written, :sequence_len] = 1
+        arrays["ner_labels"][num_written, 1:sequence_len - 1] = [ENTITY_LABEL_NUM[label] for label in sentence_tokens_labels[:max_tokens]]
+        arrays["intent_labels"][num_written] = INTENT_LABEL_NUM[intent_label]
+        num_written += 1
 
-    
+    for array in arrays.values():
+        array.flush()
+
+    if num_written < num_elements:
+        # less elements than expected: keep only the written rows, truncating the files (no longer mapped) in place
+        names = list(arrays.keys())
+        arrays.clear()
+
+        for name in names:
+            truncate_npy_rows(os.path.join(output_dirpath, name + ".npy"), num_written)
+
+    return num_written, num_truncated
+
+def truncate_npy_rows(npy_filepath, num_rows):
+    """
+    Keep only the first num_rows rows of a (C-ordered) .npy file, without loading it: the header is rewritten 
+    with the new shape (padded to its previous length, so the data does not move) and the file is truncated
+    """
+    with open(npy_filepath, "r+b") as file:
+        version = np.lib.format.read_magic(file)
+        header_length_size = 2 if version == (1, 0) else 4
+        read_array_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_array_header(file)
+        data_offset = file.tell()
+
+        header = repr({"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": fortran_order, "shape": (num_rows,) + shape[1:]})
+        header_start = len(np.lib.format.MAGIC_PREFIX) + 2 + header_length_size
+        file.seek(header_start)
+        file.write((header + " " * (data_offset - header_start - len(header) - 1) + "\n").encode("latin1"))
+
+        row_size = dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64))
+        file.truncate(data_offset + num_rows * row_size)
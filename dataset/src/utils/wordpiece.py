@@ -0,0 +1,283 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+# key of the trie nodes where the id of the token ending in that node is stored (no char is an empty string)
+TOKEN_ID_KEY = ""
+# prefix of the wordpieces continuing a word
+CONTINUATION_PREFIX = "##"
+
+# ascii texts without control chars can be split with a regex (lowercasing them keeps the offsets unchanged):
+# a word is a sequence of letters and digits, while every other (non-space) ascii char is a punctuation char
+ASCII_CONTROL_CHARS_REGEX = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+ASCII_WORDS_REGEX = re.compile(r"[A-Za-z0-9]+|[^\sA-Za-z0-9]")
+
+def load_vocab(vocab_filepath):
+    """
+    Read a BERT vocab.txt file (one token per line) into a dict token -> id
+    """
+    with open(vocab_filepath, "r", encoding="utf-8") as file:
+        return {line.rstrip("\n"): i for i, line in enumerate(file)}
+
+def build_trie(vocab):
+    """
+    Build a prefix trie of the vocab tokens: each node is a dict char -> child node, and the nodes
+    where a token ends also store its id (under TOKEN_ID_KEY)
+    """
+    root = {}
+
+    for token, token_id in vocab.items():
+        node = root
+        for char in token:
+            node = node.setdefault(char, {})
+
+        node[TOKEN_ID_KEY] = token_id
+
+    return root
+
+def is_whitespace(char):
+    if char in " \t\n\r":
+        return True
+    return unicodedata.category(char) == "Zs"
+
+def is_control(char):
+    if char in "\t\n\r":
+        return False
+    return unicodedata.category(char).startswith("C")
+
+def is_punctuation(char):
+    cp = ord(char)
+    # all the non-letter/number ascii chars are considered punctuation, as in BERT
+    if 33 <= cp <= 47 or 58 <= cp <= 64 or 91 <= cp <= 96 or 123 <= cp <= 126:
+        return True
+    return unicodedata.category(char).startswith("P")
+
+def is_chinese_char(char):
+    cp = ord(char)
+    return (0x4E00 <= cp <= 0x9FFF or 0x3400 <= cp <= 0x4DBF or 0x20000 <= cp <= 0x2A6DF or
+            0x2A700 <= cp <= 0x2B73F or 0x2B740 <= cp <= 0x2B81F or 0x2B820 <= cp <= 0x2CEAF or
+            0xF900 <= cp <= 0xFAFF or 0x2F800 <= cp <= 0x2FA1F)
+
+class WordPieceTokenizer:
+    """
+    Self-contained (pure Python) implementation of the BERT uncased tokenizer: basic tokenization
+    (text cleaning, lowercasing, accents stripping, whitespace and punctuation splitting) followed by
+    the greedy longest-match-first WordPiece algorithm, which walks a prefix trie of the vocab.
+    It mimics the subset of the transformers tokenizers API used by the dataset generators, so
+    it can be used in place of AutoTokenizer.from_pretrained("bert-base-uncased") without loading
+    transformers (nor needing the HuggingFace cache).
+    args:
+    - vocab: a dict token -> id (see load_vocab())
+    - do_lower_case: lowercase the text and strip the accents (as in the uncased BERT models)
+    """
+
+    # capability checked by the labelling functions (it is not a "fast" tokenizer, but it supports return_offsets_mapping)
+    supports_offsets_mapping = True
+
+    def __init__(self, vocab, do_lower_case=True, unk_token="[UNK]", cls_token="[CLS]", sep_token="[SEP]",
+                 pad_token="[PAD]", max_input_chars_per_word=100, word_cache_size=2**16):
+        # (arguments kept to rebuild the tokenizer when it is unpickled, e.g. in a worker process)
+        self.init_kwargs = dict(vocab=vocab, do_lower_case=do_lower_case, unk_token=unk_token, cls_token=cls_token,
+                                sep_token=sep_token, pad_token=pad_token, max_input_chars_per_word=max_input_chars_per_word,
+                                word_cache_size=word_cache_size)
+        self.vocab = vocab
+        self.ids_to_tokens = {token_id: token for token, token_id in vocab.items()}
+        self.do_lower_case = do_lower_case
+        self.max_input_chars_per_word = max_input_chars_per_word
+
+        self.unk_token = unk_token
+        self.cls_token = cls_token
+        self.sep_token = sep_token
+        self.pad_token = pad_token
+        self.unk_token_id = vocab[unk_token]
+        self.cls_token_id = vocab[cls_token]
+        self.sep_token_id = vocab[sep_token]
+        self.pad_token_id = vocab[pad_token]
+
+        self.trie = build_trie(vocab)
+        # the pieces continuing a word are searched starting from the node of their prefix
+        self.continuation_trie = self.trie
+        for char in CONTINUATION_PREFIX:
+            self.continuation_trie = self.continuation_trie.get(char, {})
+
+        # words are repeated a lot in the generated sentences: cache their wordpieces
+        self.wordpiece = lru_cache(maxsize=word_cache_size)(self.wordpiece)
+
+    def __getstate__(self):
+        # the trie and the words cache are rebuilt instead of being pickled
+        return self.init_kwargs
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @classmethod
+    def from_vocab_file(cls, vocab_filepath, **kwargs):
+        return cls(load_vocab(vocab_filepath), **kwargs)
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def normalize_char(self, char):
+        if self.do_lower_case:
+            # strip accents (decomposing the char and removing the combining marks) and lowercase
+            char = "".join(c for c in unicodedata.normalize("NFD", char) if unicodedata.category(c) != "Mn")
+            char = char.lower()
+
+        return char
+
+    def split_words(self, text):
+        """
+        Basic tokenization: clean and normalize the text and split it on whitespaces and punctuation.
+        - output: a list of (word, chars_offsets) pairs, where chars_offsets[i] is the index, in the
+          original text, of the char originating the i-th char of the (normalized) word
+        """
+        if text.isascii() and ASCII_CONTROL_CHARS_REGEX.search(text) is None:
+            if self.do_lower_case:
+                text = text.lower()
+
+            return [(match.group(), range(match.start(), match.end())) for match in ASCII_WORDS_REGEX.finditer(text)]
+
+        words = []
+        word_chars = []
+        word_offsets = []
+
+        def end_word():
+            if len(word_chars) > 0:
+                words.append(("".join(word_chars), list(word_offsets)))
+                word_chars.clear()
+                word_offsets.clear()
+
+        for i, char in enumerate(text):
+            if ord(char) == 0 or ord(char) == 0xFFFD or is_control(char):
+                continue
+
+            if is_whitespace(char):
+                end_word()
+                continue
+
+            if is_chinese_char(char):
+                end_word()
+                words.append((char, [i]))
+                continue
+
+            for normalized_char in self.normalize_char(char):
+                if is_whitespace(normalized_char):
+                    end_word()
+                elif is_punctuation(normalized_char):
+                    end_word()
+                    words.append((normalized_char, [i]))
+                else:
+                    word_chars.append(normalized_char)
+                    word_offsets.append(i)
+
+        end_word()
+        return words
+
+    def wordpiece(self, word):
+        """
+        Split a single word in wordpieces, looking for the longest vocab token matching
+        at each position of the word (walking the prefix trie).
+        - output: a tuple of (token_id, start, end) triples, where start and end are chars indices in the word
+        """
+        if len(word) > self.max_input_chars_per_word:
+            return ((self.unk_token_id, 0, len(word)),)
+
+        pieces = []
+        start = 0
+
+        while start < len(word):
+            node = self.trie if start == 0 else self.continuation_trie
+            token_id = None
+            end = start
+
+            for i in range(start, len(word)):
+                node = node.get(word[i])
+                if node is None:
+                    break
+
+                if TOKEN_ID_KEY in node:
+                    token_id = node[TOKEN_ID_KEY]
+                    end = i + 1
+
+            if token_id is None:
+                # the word cannot be represented with the vocab tokens
+                return ((self.unk_token_id, 0, len(word)),)
+
+            pieces.append((token_id, start, end))
+            start = end
+
+        return tuple(pieces)
+
+    def encode_text(self, text):
+        """
+        - output: the list of the token ids of the text, and the list of the corresponding (start, end) chars offsets
+        """
+        ids = []
+        offsets = []
+
+        for word, chars_offsets in self.split_words(text):
+            for token_id, start, end in self.wordpiece(word):
+                ids.append(token_id)
+                offsets.append((chars_offsets[start], chars_offsets[end - 1] + 1))
+
+        return ids, offsets
+
+    def tokenize(self, text):
+        return [self.ids_to_tokens[token_id] for word, _ in self.split_words(text) for token_id, _, _ in self.wordpiece(word)]
+
+    def tokenize_batch(self, texts):
+        return [self.tokenize(text) for text in texts]
+
+    def convert_tokens_to_ids(self, tokens):
+        if isinstance(tokens, str):
+            return self.vocab.get(tokens, self.unk_token_id)
+        return [self.vocab.get(token, self.unk_token_id) for token in tokens]
+
+    def convert_ids_to_tokens(self, ids):
+        if isinstance(ids, int):
+            return self.ids_to_tokens[ids]
+        return [self.ids_to_tokens[token_id] for token_id in ids]
+
+    def __call__(self, text, add_special_tokens=True, is_split_into_words=False, return_offsets_mapping=False):
+        """
+        Encode a text (or a batch of texts), as the transformers tokenizers do.
+        args:
+        - text: a string or a list of strings (with is_split_into_words, a list of words or a list of lists of words)
+        - output: a dict with the input_ids, token_type_ids and attention_mask lists (and offset_mapping, if requested),
+          for the single text or for each text of the batch
+        """
+        is_batch = isinstance(text, (list, tuple)) and (not is_split_into_words or
+                                                        (len(text) > 0 and isinstance(text[0], (list, tuple))))
+        texts = text if is_batch else [text]
+        encodings = {"input_ids": [], "token_type_ids": [], "attention_mask": []}
+
+        if return_offsets_mapping:
+            encodings["offset_mapping"] = []
+
+        for sequence in texts:
+            if is_split_into_words:
+                # the offsets refer to each single word
+                ids = []
+                offsets = []
+                for word in sequence:
+                    word_ids, word_offsets = self.encode_text(word)
+                    ids += word_ids
+                    offsets += word_offsets
+            else:
+                ids, offsets = self.encode_text(sequence)
+
+            if add_special_tokens:
+                ids = [self.cls_token_id] + ids + [self.sep_token_id]
+                offsets = [(0, 0)] + offsets + [(0, 0)]
+
+            encodings["input_ids"].append(ids)
+            encodings["token_type_ids"].append([0] * len(ids))
+            encodings["attention_mask"].append([1] * len(ids))
+
+            if return_offsets_mapping:
+                encodings["offset_mapping"].append(offsets)
+
+        if not is_batch:
+            encodings = {key: values[0] for key, values in encodings.items()}
+
+        return encodings